@@ -1,7 +1,7 @@
+import os
 import sys
 import logging
 import argparse
-import time
 from pathlib import Path
 
 # Ensure Python finds the 'src' module
@@ -26,16 +26,70 @@ def setup_logging(debug_mode: bool):
 
 def main():
     parser = argparse.ArgumentParser(description="Automated PDF Merger V1")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "serve", "backfill", "soak"],
+                        help="run: process the input folders (default). "
+                             "serve: keep YOLO + RapidOCR warm for other runs. "
+                             "backfill <path>: import a historical archive in place. "
+                             "soak [workdir]: run the daemon for hours on synthetic documents and check for growth")
+    parser.add_argument("path", nargs="?", help="Directory tree to import (backfill), scratch workspace (soak)")
+    parser.add_argument("--doc-type", choices=["po", "do", "si"],
+                        help="Backfill: force the document type instead of guessing from folder/file names")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Backfill: files per processing chunk")
+    parser.add_argument("--hours", type=float, default=4, help="Soak: test duration")
+    parser.add_argument("--feed-interval", type=float, default=30, help="Soak: seconds between synthetic bundles")
     parser.add_argument("--debug", action="store_true", help="Enable verbose logging")
     parser.add_argument("--loop", action="store_true", help="Run continuously")
-    parser.add_argument("--interval", type=int, default=60, help="Sleep interval")
+    parser.add_argument("--interval", type=int, default=60, help="Max idle backoff (seconds) in loop mode")
+    parser.add_argument("--min-interval", type=float, default=1, help="Min rescan delay (seconds) in loop mode")
+    parser.add_argument("--batch-size", type=int, default=10, help="Files processed per scheduler step")
+    parser.add_argument("--fixtures", choices=["record", "replay"],
+                        help="record: save every extractor/Gemini output to REPLAY_DIR. "
+                             "replay: play them back offline (benchmarks, profiling)")
     
     args = parser.parse_args()
+    if args.command == "backfill" and not args.path:
+        parser.error("backfill needs a <path>")
 
     # 1. Setup Environment FIRST
     setup_logging(args.debug)
     logger = logging.getLogger(__name__)
     
+    if args.command == "serve":
+        os.environ["USE_INFERENCE_SERVER"] = "0"  # don't connect to ourselves
+        from src.extractors import YOLO_MODEL_PATH
+        from src.extractors.inference_server import InferenceServer
+        try:
+            InferenceServer(model_path=YOLO_MODEL_PATH).serve_forever()
+        except KeyboardInterrupt:
+            logger.info("STOP command received.")
+        return
+
+    if args.command == "soak":
+        from dotenv import load_dotenv
+        from src.core.soak import GeminiStub
+        # Resolve repo-relative files before leaving the current directory
+        repo = Path(__file__).resolve().parent
+        load_dotenv(repo / ".env")
+        model_path = os.path.abspath(os.getenv("YOLO_MODEL_PATH", str(repo / "po_detector.pt")))
+        if not os.path.exists(model_path):
+            parser.error(f"soak needs the YOLO model (not found at {model_path}; set YOLO_MODEL_PATH)")
+
+        workdir = os.path.abspath(args.path or "soak_workspace")
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)  # input/output folders, DB and caches stay in the scratch area
+        stub = GeminiStub()
+        stub.start()
+        # Read when the extractors load, so set before importing the pipeline
+        os.environ["YOLO_MODEL_PATH"] = model_path
+        os.environ["DB_PATH"] = "soak_state.db"  # never the production DB from .env
+        os.environ.setdefault("GEMINI_API_KEY", "soak-test")
+        os.environ["GEMINI_API_ENDPOINT"] = stub.endpoint
+        os.environ["USE_INFERENCE_SERVER"] = "0"  # in-process models: their memory is what's measured
+        os.environ["REPLAY_MODE"] = "off"
+
+    if args.fixtures:
+        os.environ["REPLAY_MODE"] = args.fixtures  # read when the extractors load
+
     # 2. Import Modules AFTER logging is setup
     # This ensures we see the "YOLO loaded" messages
     from src.core.pipeline import PipelineOrchestrator
@@ -47,11 +101,26 @@ def main():
     try:
         orchestrator = PipelineOrchestrator()
         
-        if args.loop:
+        if args.command == "soak":
+            from src.core.soak import SoakTest
+            from src.extractors import yolo_ready
+            if not yolo_ready():
+                # Without YOLO there are no table crops: the soak would measure an idle pipeline
+                logger.critical("YOLO could not be loaded; aborting the soak test.")
+                sys.exit(1)
+            logger.info(f"Starting SOAK test for {args.hours}h in {os.getcwd()}")
+            if not SoakTest(orchestrator, args.hours, feed_interval=args.feed_interval).run():
+                sys.exit(1)
+        elif args.command == "backfill":
+            logger.info(f"Starting BACKFILL of {args.path}")
+            orchestrator.run_backfill(args.path, doc_type=args.doc_type, chunk_size=args.chunk_size)
+        elif args.loop:
             logger.info(f"Starting DAEMON mode...")
-            while True:
-                orchestrator.run()
-                time.sleep(args.interval)
+            orchestrator.run_daemon(
+                max_interval=args.interval,
+                min_interval=args.min_interval,
+                batch_size=args.batch_size
+            )
         else:
             logger.info("Starting SINGLE PASS mode.")
             orchestrator.run()
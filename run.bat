@@ -34,11 +34,11 @@ echo    PDF MERGER BOT IS RUNNING (Do not close)
 echo ========================================================
 echo  [+] Watching: Purchase_order, Delivery_note, Sales_invoice
 echo  [+] Saving to: Merged_PDFs
-echo  [+] Mode: Auto-Pilot (Scanning every 10 seconds)
+echo  [+] Mode: Auto-Pilot (Adaptive scanning, max 10 seconds idle)
 echo ========================================================
 echo.
 
-:: Run in loop mode, checking every 10 seconds
+:: Run in loop mode, backing off to at most 10 seconds when idle
 python cli.py --loop --interval 10
 
 pause
\ No newline at end of file
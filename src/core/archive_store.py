@@ -0,0 +1,108 @@
+# The Archive Store
+import os
+import errno
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedArchive:
+    """
+    The 'Vault' for processed files.
+
+    Every archived PDF is stored once under its SHA-256:
+        Archive/objects/ab/cd/abcd...ef.pdf
+    The DB index maps each original path to its object, so same-named files
+    never overwrite each other and repeated uploads cost no extra storage.
+
+    Moves are metadata-only where possible:
+    - new content    -> os.rename into the store (hardlink when keeping the source)
+    - known content  -> the source is simply removed (or left alone)
+    - cross-device   -> falls back to copy + delete
+    """
+
+    def __init__(self, root: Path, db_manager):
+        self.root = Path(root) / "objects"
+        self.db = db_manager
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / content_hash[2:4] / f"{content_hash}.pdf"
+
+    def archive_files(self, file_paths: List[str], keep_source: bool = False) -> int:
+        """
+        Archives a batch of files and writes their index rows in one transaction.
+        Returns how many files were archived.
+        """
+        entries = []
+        for src_path in file_paths:
+            entry = self._store(src_path, keep_source)
+            if entry:
+                entries.append(entry)
+
+        if entries:
+            self.db.record_archive_batch(entries)
+            deduped = sum(1 for e in entries if e['deduplicated'])
+            metrics.inc("archive_files", len(entries))
+            metrics.inc("archive_deduplicated", deduped)
+            if deduped:
+                logger.info(f"Archived {len(entries)} files ({deduped} duplicates stored once).")
+        return len(entries)
+
+    def _store(self, src_path: str, keep_source: bool) -> Optional[dict]:
+        try:
+            content_hash = file_sha256(src_path)
+            size = os.path.getsize(src_path)
+            dest = self.object_path(content_hash)
+            deduplicated = dest.exists()
+
+            if deduplicated:
+                if not keep_source:
+                    os.remove(src_path)
+            else:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                self._place(src_path, dest, keep_source)
+
+            return {
+                'original_path': src_path,
+                'filename': os.path.basename(src_path),
+                'content_hash': content_hash,
+                'stored_path': str(dest),
+                'size': size,
+                'deduplicated': deduplicated,
+            }
+        except Exception as e:
+            logger.error(f"Error archiving file {src_path}: {e}")
+            return None
+
+    @staticmethod
+    def _place(src_path: str, dest: Path, keep_source: bool):
+        try:
+            if keep_source:
+                os.link(src_path, dest)
+            else:
+                os.rename(src_path, dest)
+        except OSError as e:
+            # Different filesystem (or no hardlink support): copy instead
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            shutil.copy2(src_path, dest)
+            if not keep_source:
+                os.remove(src_path)
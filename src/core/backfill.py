@@ -0,0 +1,189 @@
+# The Backfill Runner
+import os
+import re
+import time
+import logging
+from typing import Dict, Iterator, Optional, Tuple
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+ORIGIN = 'backfill'
+REGISTER_BATCH_SIZE = 500
+
+# Folder / filename hints for the document type
+DOC_TYPE_HINTS = [
+    ('po', re.compile(r'(^|[^a-z])(po|purchase[_\s-]*orders?)([^a-z]|$)', re.IGNORECASE)),
+    ('do', re.compile(r'(^|[^a-z])(do|dn|delivery[_\s-]*(notes?|orders?))([^a-z]|$)', re.IGNORECASE)),
+    ('si', re.compile(r'(^|[^a-z])(si|invoices?|sales[_\s-]*invoices?)([^a-z]|$)', re.IGNORECASE)),
+]
+
+
+def _type_hints(part: str) -> Dict[str, int]:
+    """doc_type -> position of its first hint in `part`."""
+    hits = {}
+    for doc_type, pattern in DOC_TYPE_HINTS:
+        match = pattern.search(part)
+        if match:
+            hits[doc_type] = match.start(2)
+    return hits
+
+
+def guess_doc_type(file_path: str, root: str) -> Optional[str]:
+    """
+    Infers po/do/si from the filename and the enclosing folders.
+
+    DOs and invoices often quote the PO number, so within one name the
+    leading hint wins: Invoice_PO4500123.pdf and SI_PO12345.pdf are 'si'.
+    A filename naming a single type decides; when it names several (or
+    none) the nearest folder naming a single type decides, e.g.
+    2019/Delivery_note/DN_PO1234.pdf. Returns None when nothing matches.
+    """
+    rel = os.path.relpath(file_path, root)
+    parts = rel.split(os.sep)
+    folders = list(reversed(parts[:-1]))  # nearest first
+
+    name_hits = _type_hints(os.path.splitext(parts[-1])[0])
+    if len(name_hits) == 1:
+        return next(iter(name_hits))
+
+    folder_hits = [hits for hits in map(_type_hints, folders) if hits]
+    for hits in folder_hits:
+        if len(hits) == 1:
+            return next(iter(hits))
+
+    for hits in [name_hits] + folder_hits:
+        if hits:
+            return min(hits, key=hits.get)
+    return None
+
+
+class BackfillRunner:
+    """
+    The 'Historian'.
+
+    Imports a historical directory tree in place (files are never renamed or
+    moved). Progress lives in the state DB, so an interrupted backfill resumes
+    where it stopped:
+    1. Walk the tree lazily and register PDFs in batches (skipping known ones).
+    2. Process pending backfill files in chunks through the staged pipeline,
+       logging throughput and ETA after each chunk.
+    3. Merge once at the end.
+    """
+
+    def __init__(self, orchestrator, root: str, doc_type: Optional[str] = None,
+                 chunk_size: int = 200):
+        self.orchestrator = orchestrator
+        self.db = orchestrator.db
+        self.root = os.path.abspath(root)
+        self.forced_doc_type = doc_type
+        self.chunk_size = chunk_size
+        self.skipped = 0
+
+    def run(self):
+        if not os.path.isdir(self.root):
+            raise NotADirectoryError(self.root)
+
+        requeued = self.db.requeue_interrupted(ORIGIN)
+        if requeued:
+            logger.info(f"Resuming backfill: {requeued} interrupted files re-queued.")
+
+        checkpoint = self.db.get_backfill_run(self.root)
+        if checkpoint and checkpoint['status'] == 'SCANNED':
+            # Interrupted while processing: the registration is already complete
+            logger.info(f"Tree already scanned ({checkpoint['files_found']} files), skipping walk.")
+        else:
+            self._register_tree()
+
+        self._process_all()
+
+        logger.info("Backfill processing done. Running the final merge...")
+        merged = self.orchestrator._step_merge_documents(include_backfill=True)
+        metrics.dump()
+
+        deferred = self.db.count_files_by_status(ORIGIN).get('DEFERRED', 0)
+        if deferred:
+            # Left SCANNED: the next run skips the walk and retries them
+            logger.warning(f"Backfill paused: {merged} bundles merged, {deferred} files still deferred "
+                           f"under memory pressure. Run the backfill again to finish them.")
+            return
+        self.db.update_backfill_run(self.root, 'DONE', self.db.get_backfill_run(self.root)['files_found'])
+        logger.info(f"Backfill complete: {merged} bundles merged.")
+
+    def _walk(self) -> Iterator[Tuple[str, str, str]]:
+        """Yields (path, filename, doc_type) without building the full list."""
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError as e:
+                logger.error(f"Cannot read {folder}: {e}")
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith('.pdf'):
+                    doc_type = self.forced_doc_type or guess_doc_type(entry.path, self.root)
+                    if doc_type:
+                        yield entry.path, entry.name, doc_type
+                    else:
+                        logger.info(f"Unknown doc type, not imported: {entry.path}")
+                        self.skipped += 1
+
+    def _register_tree(self):
+        logger.info(f"Scanning {self.root} ...")
+        found, added, batch = 0, 0, []
+        for row in self._walk():
+            batch.append(row)
+            if len(batch) >= REGISTER_BATCH_SIZE:
+                added += self.db.register_files_batch(batch, origin=ORIGIN)
+                found += len(batch)
+                batch = []
+                self.db.update_backfill_run(self.root, 'SCANNING', found)
+        added += self.db.register_files_batch(batch, origin=ORIGIN)
+        found += len(batch)
+
+        self.db.update_backfill_run(self.root, 'SCANNED', found)
+        logger.info(f"Scan done: {found} PDFs ({added} new), {self.skipped} skipped (unknown doc type).")
+
+    def _process_all(self):
+        start = time.time()
+        processed = 0
+
+        while True:
+            chunk = self.db.get_pending_files(self.chunk_size, origin=ORIGIN)
+            if not chunk:
+                break
+
+            self.orchestrator._process_files_staged(chunk)
+            processed += len(chunk)
+            self._report(processed, time.time() - start)
+
+        # Files deferred under memory pressure, one at a time
+        while True:
+            done = self.orchestrator._process_deferred(self.chunk_size, origin=ORIGIN)
+            if not done:
+                break
+            processed += done
+            self._report(processed, time.time() - start)
+
+    def _report(self, processed: int, elapsed: float):
+        counts = self.db.count_files_by_status(ORIGIN)
+        remaining = counts.get('PENDING', 0) + counts.get('PROCESSING', 0) + counts.get('DEFERRED', 0)
+        total = sum(counts.values())
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = remaining / rate if rate > 0 else float('inf')
+
+        metrics.set_gauge("backfill_done", total - remaining)
+        metrics.set_gauge("backfill_remaining", remaining)
+        metrics.set_gauge("backfill_files_per_s", rate)
+        metrics.dump()
+
+        eta_text = time.strftime('%H:%M:%S', time.gmtime(eta)) if eta != float('inf') else "?"
+        if eta != float('inf') and eta >= 86400:
+            eta_text = f"{eta / 86400:.1f} days"
+        logger.info(f"📦 Backfill {total - remaining}/{total} "
+                    f"({rate * 60:.1f} files/min, ETA {eta_text})")
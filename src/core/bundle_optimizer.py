@@ -0,0 +1,99 @@
+# The Bundle Optimizer
+import os
+import logging
+from typing import List
+
+from pypdf import PdfWriter
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# Share identical streams (fonts, logos, stamps) across the merged documents
+MERGE_DEDUP = os.getenv("MERGE_DEDUP", "1") == "1"
+# Lossy: downsample page images above MERGE_IMAGE_DPI and store them as JPEG
+MERGE_RECOMPRESS_IMAGES = os.getenv("MERGE_RECOMPRESS_IMAGES", "0") == "1"
+MERGE_IMAGE_DPI = int(os.getenv("MERGE_IMAGE_DPI", "150"))
+MERGE_JPEG_QUALITY = int(os.getenv("MERGE_JPEG_QUALITY", "75"))
+# Images within this margin of the target are left alone (not worth a re-encode)
+DPI_TOLERANCE = 1.2
+
+
+def optimize_bundle(writer: PdfWriter) -> int:
+    """
+    Shrinks a freshly merged bundle in place, just before it is written.
+    Returns the number of images recompressed.
+
+    1. Dedup: objects with identical content (same vendor font / logo in
+       every document of the bundle) are stored once, orphans dropped.
+    2. Images (optional): scans stored above MERGE_IMAGE_DPI are resampled
+       to it and re-encoded as JPEG. Bilevel and transparent images are
+       kept as they are (already compact / would lose the mask).
+    """
+    if MERGE_DEDUP:
+        try:
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        except AttributeError:
+            logger.warning("pypdf without compress_identical_objects, bundle not deduplicated.")
+
+    if not MERGE_RECOMPRESS_IMAGES:
+        return 0
+
+    # After dedup a shared image is one object: once resampled, its other
+    # pages see it at the target DPI and skip it.
+    recompressed = 0
+    for page in writer.pages:
+        page_width = float(page.mediabox.width) / 72
+        page_height = float(page.mediabox.height) / 72
+        if page_width <= 0 or page_height <= 0:
+            continue
+        try:
+            images = list(page.images)
+        except Exception as e:
+            logger.debug(f"Cannot list page images: {e}")
+            continue
+
+        for image_file in images:
+            try:
+                if _recompress(image_file, page_width, page_height):
+                    recompressed += 1
+            except Exception as e:
+                logger.debug(f"Image {image_file.name} kept as is: {e}")
+
+    return recompressed
+
+
+def _recompress(image_file, page_width: float, page_height: float) -> bool:
+    from PIL import Image
+
+    image = image_file.image
+    if image is None or image.mode in ("1", "RGBA", "LA", "P"):
+        return False
+
+    # Effective resolution if the image spans the page (scans do)
+    dpi = max(image.width / page_width, image.height / page_height)
+    if dpi <= MERGE_IMAGE_DPI * DPI_TOLERANCE:
+        return False
+
+    factor = MERGE_IMAGE_DPI / dpi
+    resized = image.resize((max(1, int(image.width * factor)), max(1, int(image.height * factor))),
+                           Image.LANCZOS)
+    if resized.mode not in ("RGB", "L"):
+        resized = resized.convert("RGB")
+    image_file.replace(resized, quality=MERGE_JPEG_QUALITY)
+    return True
+
+
+def report_bundle_size(po_number: str, source_paths: List[str], output_path: str) -> int:
+    """Logs and exports bytes saved against the plain concatenated sources. Returns them."""
+    source_bytes = sum(os.path.getsize(p) for p in source_paths if os.path.exists(p))
+    output_bytes = os.path.getsize(output_path)
+    saved = source_bytes - output_bytes
+
+    metrics.inc("bundle_bytes_written", output_bytes)
+    metrics.inc("bundle_bytes_saved", max(0, saved))
+    if source_bytes:
+        logger.info(f"   Bundle {po_number}: {output_bytes / 1024:.0f} KB "
+                    f"(sources {source_bytes / 1024:.0f} KB, saved {saved * 100 / source_bytes:.0f}%)")
+    return saved
@@ -2,13 +2,28 @@
 import sqlite3
 import logging
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 
 logger = logging.getLogger(__name__)
 
+def normalize_line_ref(line_ref) -> str:
+    """'1.0' -> '1', None -> 'None' (same rules the Reconciler always used)."""
+    ref = str(line_ref).strip()
+    if ref.endswith('.0'):
+        ref = ref[:-2]
+    return ref
+
+def normalize_quantity(quantity) -> float:
+    """Numeric quantity rounded to 3 decimals so sums compare exactly."""
+    try:
+        return round(float(str(quantity).replace(',', '').strip()), 3)
+    except (TypeError, ValueError):
+        return 0.0
+
 class DatabaseManager:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._line_items_listeners = []
         self._init_db()
 
     def _get_connection(self):
@@ -29,31 +44,170 @@ class DatabaseManager:
             po_number TEXT,
             error_message TEXT,
             retry_count INTEGER DEFAULT 0,
+            origin TEXT DEFAULT 'inbox',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """
         
         # 2. Line Items Table
+        # One row per (file, table crop, row) so reprocessing a file upserts
+        # instead of appending duplicates.
         query_items = """
         CREATE TABLE IF NOT EXISTS line_items (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER,
+            page INTEGER,
+            row INTEGER,
             po_number TEXT,
             doc_type TEXT,
             line_ref TEXT,
             description TEXT,
             part_no TEXT,
-            quantity REAL,
+            quantity REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(file_id, page, row)
+        );
+        """
+
+        # 3. Merged Bundles (one row per Combined_PO_<n>.pdf) and their members
+        query_bundles = """
+        CREATE TABLE IF NOT EXISTS bundles (
+            po_number TEXT PRIMARY KEY,
+            output_path TEXT NOT NULL,
+            file_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+
+        query_bundle_members = """
+        CREATE TABLE IF NOT EXISTS bundle_members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            po_number TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            doc_type TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(po_number, file_path)
+        );
+        """
+
+        # 4. Content-Addressed Archive (one object per unique file content)
+        query_archive_objects = """
+        CREATE TABLE IF NOT EXISTS archive_objects (
+            content_hash TEXT PRIMARY KEY,
+            stored_path TEXT NOT NULL,
+            size INTEGER,
+            ref_count INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """
 
+        query_archive_entries = """
+        CREATE TABLE IF NOT EXISTS archive_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_path TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+
+        # 5. Materialized Reconciliation (maintained on every line item write)
+        query_po_summary = """
+        CREATE TABLE IF NOT EXISTS po_summary (
+            po_number TEXT PRIMARY KEY,
+            overall_status TEXT NOT NULL,
+            details TEXT,
+            line_count INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+
+        query_po_line_summary = """
+        CREATE TABLE IF NOT EXISTS po_line_summary (
+            po_number TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            line_ref TEXT,
+            description TEXT,
+            ordered REAL,
+            received REAL,
+            invoiced REAL,
+            status TEXT,
+            PRIMARY KEY (po_number, position)
+        ) WITHOUT ROWID;
+        """
+
+        # 6. Backfill Runs (checkpoint per imported directory tree)
+        query_backfill = """
+        CREATE TABLE IF NOT EXISTS backfill_runs (
+            root TEXT PRIMARY KEY,
+            status TEXT DEFAULT 'SCANNING',
+            files_found INTEGER DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+
         with self._get_connection() as conn:
             conn.execute(query_files)
+            # 'origin' arrived with backfill: add it to older databases
+            file_columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+            if 'origin' not in file_columns:
+                conn.execute("ALTER TABLE files ADD COLUMN origin TEXT DEFAULT 'inbox'")
+            conn.execute(query_backfill)
+            legacy_items = self._detach_legacy_line_items(conn)
             conn.execute(query_items)
+            if legacy_items:
+                self._import_legacy_line_items(conn)
+            conn.execute(query_bundles)
+            conn.execute(query_bundle_members)
+            conn.execute(query_archive_objects)
+            conn.execute(query_archive_entries)
+            conn.execute(query_po_summary)
+            conn.execute(query_po_line_summary)
             # Create indexes
             conn.execute("CREATE INDEX IF NOT EXISTS idx_po_number ON files(po_number);")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_items_po ON line_items(po_number);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_status ON files(status);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_origin_status ON files(origin, status);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_original ON archive_entries(original_path);")
+            conn.execute("DROP INDEX IF EXISTS idx_items_po;")
+            # Covering index: reconciliation reads never touch the table rows
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_items_recon "
+                "ON line_items(po_number, doc_type, line_ref, quantity, file_id);"
+            )
+
+    def _detach_legacy_line_items(self, conn) -> bool:
+        """Renames an old append-only line_items table (no file key) out of the way."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(line_items)")]
+        if not columns or 'file_id' in columns:
+            return False
+
+        logger.info("Migrating line_items to keyed storage...")
+        conn.execute("DROP INDEX IF EXISTS idx_items_po")
+        conn.execute("ALTER TABLE line_items RENAME TO line_items_legacy")
+        return True
+
+    def _import_legacy_line_items(self, conn):
+        """
+        Copies every legacy row into the keyed table, in its original order
+        and normalised the way new rows are (the Reconciler no longer does
+        it on read). Identical rows are real repeated items and all kept.
+        They have no file reference, so they keep a NULL file_id
+        (NULLs never collide in the UNIQUE key).
+        """
+        rows = conn.execute("""
+            SELECT po_number, doc_type, line_ref, description, part_no, quantity
+            FROM line_items_legacy ORDER BY rowid
+        """)
+        conn.executemany(
+            "INSERT INTO line_items (po_number, doc_type, line_ref, description, part_no, quantity) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((po, doc_type, normalize_line_ref(ref), desc, part, normalize_quantity(qty))
+             for po, doc_type, ref, desc, part, qty in rows)
+        )
+        conn.execute("DROP TABLE line_items_legacy")
 
     def register_file(self, file_path: str, filename: str, doc_type: str) -> bool:
         """Adds a new file to the queue. Returns False if it already exists."""
@@ -67,6 +221,51 @@ class DatabaseManager:
         except sqlite3.IntegrityError:
             return False
 
+    def register_files_batch(self, rows: List[Tuple[str, str, str]], origin: str = 'inbox') -> int:
+        """Registers many (file_path, filename, doc_type) rows at once; existing paths are skipped."""
+        if not rows: return 0
+        with self._get_connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO files (file_path, filename, doc_type, origin) VALUES (?, ?, ?, ?)",
+                [(path, name, type_, origin) for path, name, type_ in rows]
+            )
+            return conn.total_changes - before
+
+    def requeue_interrupted(self, origin: str) -> int:
+        """Puts files left in PROCESSING by a crash back to PENDING."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE files SET status = 'PENDING' WHERE status = 'PROCESSING' AND origin = ?", (origin,)
+            )
+            return cursor.rowcount
+
+    def count_files_by_status(self, origin: str) -> Dict[str, int]:
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT status, COUNT(*) FROM files WHERE origin = ? GROUP BY status", (origin,)
+            )
+            return dict(cursor.fetchall())
+
+    def get_backfill_run(self, root: str) -> Optional[dict]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM backfill_runs WHERE root = ?", (root,)).fetchone()
+            return dict(row) if row else None
+
+    def update_backfill_run(self, root: str, status: str, files_found: int):
+        with self._get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO backfill_runs (root, status, files_found, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(root) DO UPDATE SET
+                    status = excluded.status,
+                    files_found = excluded.files_found,
+                    updated_at = excluded.updated_at
+                """,
+                (root, status, files_found, datetime.now())
+            )
+
     def update_status(self, file_path: str, status: str, po_number: Optional[str] = None, error: Optional[str] = None):
         """Updates the state of a file."""
         query = """
@@ -77,64 +276,331 @@ class DatabaseManager:
         with self._get_connection() as conn:
             conn.execute(query, (status, po_number, error, datetime.now(), file_path))
 
-    def get_pending_files(self) -> List[Tuple[str, str, str]]:
+    def get_pending_files(self, limit: Optional[int] = None, origin: str = 'inbox') -> List[Tuple[str, str, str]]:
         """Fetches the next batch of work."""
+        query = "SELECT file_path, doc_type, status FROM files WHERE status = 'PENDING' AND origin = ?"
+        params = (origin,)
+        if limit:
+            query += " LIMIT ?"
+            params = (origin, limit)
         with self._get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT file_path, doc_type, status FROM files WHERE status = 'PENDING'"
-            )
+            cursor = conn.execute(query, params)
             return cursor.fetchall()
 
-    def get_mergeable_bundles(self):
-        """Finds all PO numbers that have a complete set of documents."""
+    def get_file_statuses(self, file_paths: List[str]) -> Dict[str, str]:
+        """Current status per path (paths not registered yet are left out)."""
+        statuses = {}
+        with self._get_connection() as conn:
+            for start in range(0, len(file_paths), 500):
+                chunk = file_paths[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(
+                    f"SELECT file_path, status FROM files WHERE file_path IN ({placeholders})", chunk
+                )
+                statuses.update(cursor.fetchall())
+        return statuses
+
+    def get_deferred_files(self, limit: Optional[int] = None, origin: str = 'inbox') -> List[Tuple[str, str, str]]:
+        """Files put aside under memory pressure, oldest first."""
+        query = "SELECT file_path, doc_type, status FROM files WHERE status = 'DEFERRED' AND origin = ? ORDER BY updated_at"
+        params = (origin,)
+        if limit:
+            query += " LIMIT ?"
+            params = (origin, limit)
+        with self._get_connection() as conn:
+            cursor = conn.execute(query, params)
+            return cursor.fetchall()
+
+    def get_pending_queue(self) -> List[dict]:
+        """
+        Pending files with the extra fields the prioritizer needs
+        (PO hint if one is already known, and age in seconds).
+        """
+        query = """
+        SELECT file_path, filename, doc_type, status, po_number,
+               (julianday('now') - julianday(created_at)) * 86400.0 AS age_s
+        FROM files WHERE status = 'PENDING' AND origin = 'inbox'
+        """
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query).fetchall()]
+
+    def get_open_universes(self) -> Dict[str, set]:
+        """PO numbers with solved-but-unmerged files, mapped to the doc types present."""
         with self._get_connection() as conn:
             cursor = conn.execute(
-                "SELECT po_number, file_path, doc_type FROM files WHERE status = 'SUCCESS' AND po_number IS NOT NULL"
+                "SELECT DISTINCT po_number, doc_type FROM files WHERE status = 'SUCCESS' AND po_number IS NOT NULL"
             )
             rows = cursor.fetchall()
+
+        universes = {}
+        for po, type_ in rows:
+            universes.setdefault(po, set()).add(type_)
+        return universes
+
+    def count_files(self, status: str) -> int:
+        """Queue depth for a given status (used by the scheduler metrics)."""
+        with self._get_connection() as conn:
+            cursor = conn.execute("SELECT COUNT(*) FROM files WHERE status = ?", (status,))
+            return cursor.fetchone()[0]
+
+    def get_mergeable_bundles(self, include_backfill: bool = False):
+        """
+        Finds all PO numbers that have a complete set of documents.
+        Backfilled files are left out unless asked for: a backfill merges
+        once, at the end of its run.
+        """
+        query = "SELECT po_number, file_path, doc_type, origin FROM files WHERE status = 'SUCCESS' AND po_number IS NOT NULL"
+        if not include_backfill:
+            query += " AND origin = 'inbox'"
+        with self._get_connection() as conn:
+            cursor = conn.execute(query)
+            rows = cursor.fetchall()
         
         bundles = {}
-        for po, path, type_ in rows:
+        for po, path, type_, origin in rows:
             if po not in bundles:
                 bundles[po] = []
-            bundles[po].append({'path': path, 'type': type_})
+            bundles[po].append({'path': path, 'type': type_, 'origin': origin})
         
         return bundles
 
-    def save_line_items(self, items: list):
+    def get_bundle(self, po_number: str) -> Optional[dict]:
+        """Returns the merged bundle record for a PO, or None if never merged."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM bundles WHERE po_number = ?", (po_number,)).fetchone()
+            return dict(row) if row else None
+
+    def record_bundle(self, po_number: str, output_path: str, members: List[dict], replace: bool = False):
+        """
+        Stores which files make up a merged bundle.
+        `replace` resets membership (full rebuild); otherwise members are appended.
+        """
+        now = datetime.now()
+        with self._get_connection() as conn:
+            if replace:
+                conn.execute("DELETE FROM bundle_members WHERE po_number = ?", (po_number,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO bundle_members (po_number, file_path, doc_type, added_at) VALUES (?, ?, ?, ?)",
+                [(po_number, m['path'], m.get('type'), now) for m in members]
+            )
+            count = conn.execute(
+                "SELECT COUNT(*) FROM bundle_members WHERE po_number = ?", (po_number,)
+            ).fetchone()[0]
+            conn.execute(
+                """
+                INSERT INTO bundles (po_number, output_path, file_count, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(po_number) DO UPDATE SET
+                    output_path = excluded.output_path,
+                    file_count = excluded.file_count,
+                    updated_at = excluded.updated_at
+                """,
+                (po_number, output_path, count, now)
+            )
+
+    def get_bundle_members(self, po_number: str) -> List[dict]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                "SELECT file_path, doc_type, added_at FROM bundle_members WHERE po_number = ? ORDER BY id",
+                (po_number,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def record_archive_batch(self, entries: List[dict]):
+        """Indexes a batch of archived files in a single transaction."""
+        now = datetime.now()
+        with self._get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO archive_objects (content_hash, stored_path, size, ref_count, created_at)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(content_hash) DO UPDATE SET ref_count = ref_count + 1
+                """,
+                [(e['content_hash'], e['stored_path'], e['size'], now) for e in entries]
+            )
+            conn.executemany(
+                "INSERT INTO archive_entries (original_path, filename, content_hash, archived_at) VALUES (?, ?, ?, ?)",
+                [(e['original_path'], e['filename'], e['content_hash'], now) for e in entries]
+            )
+
+    def get_file_id(self, file_path: str) -> Optional[int]:
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT id FROM files WHERE file_path = ?", (file_path,)).fetchone()
+            return row[0] if row else None
+
+    def save_line_items(self, items: list, file_id: Optional[int] = None):
         """
-        Batch inserts extracted line items.
+        Stores extracted line items, keyed by (file_id, page, row).
+        With a file_id the file's previous rows are always deleted first, so
+        a reprocess replaces them (an empty list clears them) instead of
+        appending copies.
         """
-        if not items: return
+        if not items and file_id is None: return
         
         query = """
-        INSERT INTO line_items (po_number, doc_type, line_ref, description, part_no, quantity)
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO line_items (file_id, page, row, po_number, doc_type, line_ref, description, part_no, quantity)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(file_id, page, row) DO UPDATE SET
+            po_number = excluded.po_number,
+            doc_type = excluded.doc_type,
+            line_ref = excluded.line_ref,
+            description = excluded.description,
+            part_no = excluded.part_no,
+            quantity = excluded.quantity
         """
         data = [
             (
+                file_id,
+                i.get('page', 0),
+                i.get('row', idx),
                 i['po_number'], 
                 i.get('doc_type', 'UNKNOWN'), 
-                i.get('line_ref'), 
+                normalize_line_ref(i.get('line_ref')), 
                 i.get('description'), 
                 i.get('part_no'), 
-                i.get('quantity')
+                normalize_quantity(i.get('quantity'))
             ) 
-            for i in items
+            for idx, i in enumerate(items)
         ]
         
+        affected_pos = {d[3] for d in data}
         try:
             with self._get_connection() as conn:
-                conn.executemany(query, data)
+                if file_id is not None:
+                    # A reprocess may move the file to another PO: refresh that one too
+                    previous = conn.execute(
+                        "SELECT DISTINCT po_number FROM line_items WHERE file_id = ?", (file_id,)
+                    ).fetchall()
+                    affected_pos.update(po for (po,) in previous if po)
+                    conn.execute("DELETE FROM line_items WHERE file_id = ?", (file_id,))
+
+                if data:
+                    conn.executemany(query, data)
         except Exception as e:
             logger.error(f"Failed to save line items: {e}")
+            return
+
+        for listener in self._line_items_listeners:
+            try:
+                listener(affected_pos)
+            except Exception as e:
+                logger.error(f"Line item listener failed: {e}")
+
+    def add_line_items_listener(self, callback):
+        """Registers callback(po_numbers) to run after every successful save_line_items."""
+        if callback not in self._line_items_listeners:
+            self._line_items_listeners.append(callback)
+
+    def save_po_summary(self, report: dict):
+        """Stores a reconciliation report as the PO's materialized summary."""
+        po_number = report['po_number']
+        lines = report.get('line_items', [])
+        with self._get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO po_summary (po_number, overall_status, details, line_count, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(po_number) DO UPDATE SET
+                    overall_status = excluded.overall_status,
+                    details = excluded.details,
+                    line_count = excluded.line_count,
+                    updated_at = excluded.updated_at
+                """,
+                (po_number, report['overall_status'], report.get('details'), len(lines), datetime.now())
+            )
+            conn.execute("DELETE FROM po_line_summary WHERE po_number = ?", (po_number,))
+            conn.executemany(
+                """
+                INSERT INTO po_line_summary
+                    (po_number, position, line_ref, description, ordered, received, invoiced, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (po_number, pos, l['Line'], l['Description'], l['Ordered'],
+                     l['Received'], l['Invoiced'], l['Status'])
+                    for pos, l in enumerate(lines)
+                ]
+            )
+
+    def get_po_summary(self, po_number: str) -> Optional[dict]:
+        """Reads a materialized report (same shape as Reconciler output), or None."""
+        with self._get_connection() as conn:
+            head = conn.execute(
+                "SELECT overall_status, details, line_count FROM po_summary WHERE po_number = ?",
+                (po_number,)
+            ).fetchone()
+            if head is None:
+                return None
+
+            lines = []
+            if head[2]:
+                cursor = conn.execute(
+                    """
+                    SELECT line_ref, description, ordered, received, invoiced, status
+                    FROM po_line_summary WHERE po_number = ? ORDER BY position
+                    """,
+                    (po_number,)
+                )
+                lines = [
+                    {"Line": r[0], "Description": r[1], "Ordered": r[2],
+                     "Received": r[3], "Invoiced": r[4], "Status": r[5]}
+                    for r in cursor.fetchall()
+                ]
+
+        report = {"po_number": po_number, "overall_status": head[0], "line_items": lines}
+        if head[1]:
+            report["details"] = head[1]
+        return report
+
+    def fetch_reconciliation_rows(self, po_number: str) -> List[dict]:
+        """
+        Quantities for one PO, served from the idx_items_recon covering index:
+        PO rows one by one in insertion order, DO/SI rows summed per
+        (doc_type, line_ref, file).
+        """
+        query = """
+        SELECT doc_type, line_ref, file_id, quantity, id AS seq
+        FROM line_items WHERE po_number = ? AND doc_type = 'po'
+        UNION ALL
+        SELECT doc_type, line_ref, file_id, SUM(quantity), MAX(id)
+        FROM line_items WHERE po_number = ? AND doc_type <> 'po'
+        GROUP BY doc_type, line_ref, file_id
+        ORDER BY seq
+        """
+        try:
+            with self._get_connection() as conn:
+                conn.row_factory = sqlite3.Row
+                return [dict(row) for row in conn.execute(query, (po_number, po_number)).fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to fetch reconciliation rows for {po_number}: {e}")
+            return []
+
+    def fetch_po_item_details(self, po_number: str) -> Dict[str, dict]:
+        """Description / part number per line_ref, from the PO document only."""
+        query = """
+        SELECT line_ref, description, part_no FROM line_items
+        WHERE po_number = ? AND doc_type = 'po'
+        ORDER BY id
+        """
+        try:
+            with self._get_connection() as conn:
+                rows = conn.execute(query, (po_number,)).fetchall()
+            return {ref: {'description': desc, 'part_no': part} for ref, desc, part in rows}
+        except Exception as e:
+            logger.error(f"Failed to fetch PO item details for {po_number}: {e}")
+            return {}
 
     def fetch_line_items(self, po_number: str) -> List[dict]:
         """
         Returns all line items associated with a PO Number.
         Used by the Reconciler to validate bundles.
         """
-        query = "SELECT * FROM line_items WHERE po_number = ?"
+        query = """
+        SELECT file_id, page, row, po_number, doc_type, line_ref, description, part_no, quantity
+        FROM line_items WHERE po_number = ?
+        """
         try:
             with self._get_connection() as conn:
                 # Use row_factory to get dict-like objects
@@ -1,3 +1,4 @@
+import io
 import os
 import shutil
 import logging
@@ -77,10 +78,6 @@ class FileSystemManager:
         """Moves a failed file out of the processing queue."""
         self._move_file(file_path, self.dirs['quarantine'])
 
-    def move_to_archive(self, file_path: str):
-        """Moves a successfully processed file."""
-        self._move_file(file_path, self.dirs['archive'])
-
     def _move_file(self, src_path: str, dest_folder: Path):
         try:
             shutil.move(src_path, dest_folder / Path(src_path).name)
@@ -94,11 +91,36 @@ class FileSystemManager:
         """
         filename = f"Combined_PO_{po_number}.pdf"
         output_path = self.dirs['output'] / filename
+        tmp_path = output_path.with_suffix(".pdf.tmp")
         
         try:
-            with open(output_path, "wb") as f:
+            # Write aside and swap, so a crash never leaves a half-written bundle
+            with open(tmp_path, "wb") as f:
                 pdf_writer.write(f)
+            os.replace(tmp_path, output_path)
             return str(output_path)
         except Exception as e:
             logger.error(f"Failed to save merged PDF {filename}: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def append_to_merged_pdf(self, pdf_writer, output_path: str) -> int:
+        """
+        Appends an incremental update to an existing merged PDF.
+        `pdf_writer` must be a pypdf writer opened with incremental=True on
+        `output_path`; only the bytes it adds after the original file are
+        written, the earlier content is never rewritten.
+        Returns the number of bytes appended.
+        """
+        original_size = os.path.getsize(output_path)
+        buffer = io.BytesIO()
+        pdf_writer.write(buffer)
+        data = buffer.getbuffer()
+
+        if len(data) <= original_size:
+            raise ValueError(f"Incremental update for {output_path} is empty")
+
+        with open(output_path, "ab") as f:
+            f.write(data[original_size:])
+            f.flush()
+            os.fsync(f.fileno())
+        return len(data) - original_size
\ No newline at end of file
@@ -0,0 +1,191 @@
+# The Memory Governor
+import os
+import gc
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# RSS budget for the whole process in MB (0 = governor off)
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", "0"))
+# Fractions of the budget where the two pressure levels start
+MEMORY_SOFT_RATIO = float(os.getenv("MEMORY_SOFT_RATIO", "0.75"))
+MEMORY_HARD_RATIO = float(os.getenv("MEMORY_HARD_RATIO", "0.9"))
+# Page bitmaps alive at once (render -> detect/OCR) per level
+PAGES_IN_FLIGHT = {'normal': int(os.getenv("PAGES_IN_FLIGHT", "4")), 'soft': 2, 'hard': 1}
+# Render scale multiplier per level (3x YOLO render -> 2.25x under soft pressure)
+SCALE_FACTOR = {'normal': 1.0, 'soft': 0.75, 'hard': 0.6}
+# Pages per document per level (table detection / full-page OCR)
+PAGE_CAP = {'normal': None, 'soft': 3, 'hard': 2}
+# Under hard pressure, files at least this big wait for the low-concurrency pass
+DEFER_MIN_FILE_MB = float(os.getenv("DEFER_MIN_FILE_MB", "1"))
+# RSS readings are reused for this long
+SAMPLE_SECONDS = 0.5
+
+LEVELS = ('normal', 'soft', 'hard')
+
+
+def _read_rss_mb() -> Optional[float]:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _PageSlots:
+    """A semaphore whose capacity can shrink/grow while in use."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def set_capacity(self, capacity: int):
+        with self._cond:
+            self.capacity = capacity
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_use >= self.capacity:
+                self._cond.wait()
+            self.in_use += 1
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify_all()
+
+
+class MemoryGovernor:
+    """
+    The 'Ballast Tank'.
+
+    Watches the process RSS against MEMORY_BUDGET_MB and trades quality or
+    throughput for headroom before the node runs out of memory:
+
+      normal (< soft) : full render scale, PAGES_IN_FLIGHT page bitmaps at once
+      soft            : ~0.75x render scale, 2 pages in flight, 3 pages/document
+      hard (>= hard)  : ~0.6x render scale, 1 page in flight, 2 pages/document,
+                        large files are DEFERRED to a sequential pass later
+
+    Page bitmaps are the big allocations (a scale=3 A4 page is ~25 MB), so
+    the in-flight cap is what shrinks effective worker concurrency: stage
+    workers beyond it wait before rendering. Every decision is counted in
+    the metrics ("memory_*").
+    """
+
+    def __init__(self, budget_mb: float = MEMORY_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self.enabled = budget_mb > 0
+        self._level = 'normal'
+        self._rss_mb = 0.0
+        self._sampled_at = 0.0
+        self._lock = threading.Lock()
+        self._slots = _PageSlots(PAGES_IN_FLIGHT['normal'])
+
+        if self.enabled and _read_rss_mb() is None:
+            logger.warning("Cannot read process memory (install psutil); memory governor disabled.")
+            self.enabled = False
+        if self.enabled:
+            logger.info(f"Memory governor on: budget {budget_mb:.0f} MB")
+            metrics.register_collector("memory", self.snapshot)
+
+    def level(self) -> str:
+        """Current pressure level, from an RSS sample at most SAMPLE_SECONDS old."""
+        if not self.enabled:
+            return 'normal'
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._sampled_at < SAMPLE_SECONDS:
+                return self._level
+            self._sampled_at = now
+            self._rss_mb = _read_rss_mb() or self._rss_mb
+
+            ratio = self._rss_mb / self.budget_mb
+            if ratio >= MEMORY_HARD_RATIO:
+                level = 'hard'
+            elif ratio >= MEMORY_SOFT_RATIO:
+                level = 'soft'
+            else:
+                level = 'normal'
+
+            if level != self._level:
+                logger.warning(f"Memory {self._rss_mb:.0f}/{self.budget_mb:.0f} MB: "
+                               f"{self._level} -> {level}")
+                metrics.inc(f"memory_level_{level}")
+                if LEVELS.index(level) > LEVELS.index(self._level):
+                    gc.collect()  # drop cyclic garbage (PIL/numpy) before degrading further
+                self._level = level
+                self._slots.set_capacity(PAGES_IN_FLIGHT[level])
+            return level
+
+    def render_scale(self, scale: float) -> float:
+        factor = SCALE_FACTOR[self.level()]
+        if factor < 1.0:
+            metrics.inc("memory_render_downscaled")
+        return scale * factor
+
+    def page_cap(self, pages: int) -> int:
+        cap = PAGE_CAP[self.level()]
+        if cap is not None and pages > cap:
+            metrics.inc("memory_pages_capped", pages - cap)
+            return cap
+        return pages
+
+    @contextmanager
+    def page_slot(self):
+        """Hold while a full-size page bitmap is alive."""
+        if not self.enabled:
+            yield
+            return
+        self.level()  # refresh capacity before waiting on it
+        start = time.perf_counter()
+        self._slots.acquire()
+        waited = time.perf_counter() - start
+        if waited > 0.01:
+            metrics.inc("memory_page_waits")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def should_defer(self, file_path: str) -> bool:
+        """Under hard pressure, large files wait for the low-concurrency pass."""
+        if self.level() != 'hard':
+            return False
+        try:
+            size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        except OSError:
+            return False
+        if size_mb >= DEFER_MIN_FILE_MB:
+            metrics.inc("memory_files_deferred")
+            return True
+        return False
+
+    def snapshot(self) -> dict:
+        level = self.level()
+        return {
+            "rss_mb": round(self._rss_mb, 1),
+            "budget_mb": self.budget_mb,
+            "level": level,
+            "pages_in_flight": self._slots.in_use,
+            "page_slots": self._slots.capacity,
+        }
+
+
+governor = MemoryGovernor()
@@ -0,0 +1,76 @@
+# The Metrics Layer
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """
+    The 'Dashboard' of the system.
+    A tiny in-process registry of counters, gauges and live collectors.
+
+    Subsystems either push values (inc / set_gauge) or register a collector
+    callable that is asked for its current state whenever a snapshot is taken.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+
+    def inc(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_collector(self, name: str, collector: Callable[[], Any]):
+        """Registers a callable whose return value is embedded in every snapshot."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                "timestamp": time.time(),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+            collectors = list(self._collectors.items())
+
+        # Collectors take their own locks, so call them outside ours
+        for name, collector in collectors:
+            try:
+                data[name] = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector '{name}' failed: {e}")
+        return data
+
+    def dump(self, path: str = None):
+        """
+        Writes the current snapshot as JSON.
+        Defaults to METRICS_PATH from the environment; does nothing if unset.
+        """
+        path = path or os.getenv("METRICS_PATH")
+        if not path:
+            return
+
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f, indent=2, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Failed to write metrics to {path}: {e}")
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
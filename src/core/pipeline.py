@@ -1,15 +1,26 @@
-import time
 import logging
 import os
+import threading
 from dotenv import load_dotenv 
-from typing import List, Dict
-from pypdf import PdfWriter, PdfReader
+from typing import List
+from pypdf import PdfWriter
 import json
 
 # Import our modules
 from .database import DatabaseManager
 from .file_utils import FileSystemManager
+from .metrics import metrics
+from .scheduler import AdaptiveScheduler, Stage
+from .priority import BundlePrioritizer
+from .archive_store import ContentAddressedArchive
+from .streaming import prefetch
+from .stages import StagedPipeline, StageSpec
+from .backfill import BackfillRunner
+from .bundle_optimizer import optimize_bundle, report_bundle_size
+from .memory_governor import governor
 from ..extractors import get_document_info, _yolo_extractor 
+from ..extractors.replay import fixtures
+from ..extractors.layout_cache import TEMPLATE_INFO_KEY
 from src.extractors.api_connector import extract_line_items_from_crop
 from src.logic.linker import link_extracted_data
 from src.logic.reconciler import Reconciler
@@ -20,21 +31,95 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Late documents for an already merged PO are appended to its bundle
+INCREMENTAL_MERGE = os.getenv("INCREMENTAL_MERGE", "1") == "1"
+
+# Table crops buffered between the YOLO producer and the Gemini consumer
+CROP_QUEUE_SIZE = int(os.getenv("CROP_QUEUE_SIZE", "2"))
+
+# Staged processing: resolve -> tables -> extract -> commit, run concurrently
+STAGED_PIPELINE = os.getenv("STAGED_PIPELINE", "1") == "1"
+STAGE_WORKERS = {
+    'resolve': int(os.getenv("STAGE_WORKERS_RESOLVE", "1")),
+    'tables': int(os.getenv("STAGE_WORKERS_TABLES", "1")),
+    'extract': int(os.getenv("STAGE_WORKERS_EXTRACT", "4")),
+    'commit': 1,  # single SQLite writer
+}
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "4"))
+
+
+class _FileJob:
+    """One file travelling through the staged pipeline (fan-out per crop, fan-in at commit)."""
+
+    def __init__(self, file_path: str, doc_type: str):
+        self.file_path = file_path
+        self.doc_type = doc_type
+        self.po_number = None
+        self.items = []
+        self.crops_emitted = 0
+        self.crops_done = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def add_crop(self):
+        with self.lock:
+            self.crops_emitted += 1
+
+    def finish_crop(self, rows: list) -> bool:
+        """Returns True when this was the last outstanding crop."""
+        with self.lock:
+            self.items.extend(rows)
+            self.crops_done += 1
+            return self.closed and self.crops_done == self.crops_emitted
+
+    def close(self) -> bool:
+        """No more crops coming. Returns True if the job is ready to commit."""
+        with self.lock:
+            self.closed = True
+            return self.crops_done == self.crops_emitted
+
+
 class PipelineOrchestrator:
     def __init__(self):
         self.fs = FileSystemManager()
         db_path = os.getenv("DB_PATH", "merger_state.db")
         self.db = DatabaseManager(db_path) 
+        self.prioritizer = BundlePrioritizer(self.db)
+        self.archive = ContentAddressedArchive(self.fs.dirs['archive'], self.db)
+        self.reconciler = Reconciler(self.db)
         self.type_priority = {'po': 1, 'do': 2, 'si': 3}
+        self.scheduler = None  # set while run_daemon() is running
 
     def run(self):
         logger.info(">>> Starting Pipeline Pass")
         self._step_scan_inputs()
         self._step_process_files()
+        self._process_deferred()
         self._step_merge_documents()
+        metrics.dump()
         logger.info(">>> Pipeline Pass Completed")
 
-    def _step_scan_inputs(self):
+    def run_daemon(self, max_interval: float = 60, min_interval: float = 1, batch_size: int = 10):
+        """
+        Continuous mode. Scan, process and merge run as separate stages:
+        each backs off while idle and is re-run as soon as upstream work lands,
+        so a dropped file waits on processing time rather than a fixed sleep.
+        Processing goes in batches so merges can happen mid-burst.
+        """
+        scheduler = self.scheduler = AdaptiveScheduler()
+        scheduler.add_stage(Stage("scan", self._step_scan_inputs,
+                                  min_interval, max_interval, downstream=["process"]))
+        scheduler.add_stage(Stage("process", lambda: self._step_process_files(limit=batch_size),
+                                  min_interval, max_interval, downstream=["merge"]))
+        scheduler.add_stage(Stage("merge", self._step_merge_documents,
+                                  min_interval, max_interval))
+        scheduler.run_forever()
+
+    def run_backfill(self, root: str, doc_type: str = None, chunk_size: int = 200):
+        """Imports a historical directory tree in place (see BackfillRunner)."""
+        BackfillRunner(self, root, doc_type=doc_type, chunk_size=chunk_size).run()
+
+    def _step_scan_inputs(self) -> int:
         logger.info("Scanning input directories...")
         found_files = self.fs.scan_and_rename()
         new_count = 0
@@ -43,69 +128,204 @@ class PipelineOrchestrator:
                 new_count += 1
         if new_count > 0:
             logger.info(f"Registered {new_count} new files.")
+        metrics.set_gauge("queue_pending", self.db.count_files('PENDING'))
+        return new_count
 
-    def _step_process_files(self):
-        pending_files = self.db.get_pending_files()
-        if not pending_files: return
+    def _step_process_files(self, limit: int = None) -> int:
+        # Bundle-aware order: POs first, near-complete universes next, plus aging
+        pending_files = self.prioritizer.order(limit)
+        if not pending_files:
+            # Queue is idle: time for files put aside under memory pressure
+            return self._process_deferred(limit)
 
         logger.info(f"Processing {len(pending_files)} pending files...")
 
-        for file_path, doc_type, current_status in pending_files:
-            if not os.path.exists(file_path):
-                logger.warning(f"👻 File vanished: {file_path}. Marking as FAILED.")
-                self.db.update_status(file_path, 'FAILED', error="File Not Found on Disk")
-                continue
+        if STAGED_PIPELINE:
+            self._process_files_staged(pending_files)
+        else:
+            self._process_files_sequential(pending_files)
 
-            try:
-                self.db.update_status(file_path, 'PROCESSING')
-                
-                # 1. Extract PO Number
-                doc_info = get_document_info(file_path, doc_type)
-
-                if doc_info.po_number:
-                    self.db.update_status(file_path, 'SUCCESS', po_number=doc_info.po_number)
-                    logger.info(f"✓ Solved: {doc_type.upper()} -> PO: {doc_info.po_number}")
-                    
-                    # 2. Extract Line Items (YOLO Only)
-                    if _yolo_extractor:
-                        # Scan for tables (This now uses the updated 5-page scan)
-                        table_crops = _yolo_extractor.extract_all_table_crops(file_path)
-                        
-                        all_extracted_items = []
-                        if table_crops:
-                            for i, crop in enumerate(table_crops):
-                                # Send to Cloud API
-                                json_str = extract_line_items_from_crop(crop)
-                                try:
-                                    raw_data = json.loads(json_str)
-                                    if raw_data:
-                                        all_extracted_items.extend(raw_data)
-                                except Exception as e:
-                                    logger.error(f"   Failed to parse API JSON: {e}")
-                            
-                            if all_extracted_items:
-                                linked_data = link_extracted_data(doc_info.po_number, all_extracted_items)
-                                for item in linked_data:
-                                    item['doc_type'] = doc_type
-                                
-                                self.db.save_line_items(linked_data)
-                                logger.info(f"   + Extracted {len(linked_data)} items from {len(table_crops)} pages.")
-                            else:
-                                logger.warning(f"   YOLO found tables, but Gemini extracted 0 items.")
-                        else:
-                            logger.warning(f"   No table found by YOLO for {file_path}. Skipping line items.")
+        metrics.set_gauge("queue_pending", self.db.count_files('PENDING'))
+        metrics.set_gauge("queue_deferred", self.db.count_files('DEFERRED'))
+        return len(pending_files)
 
-                else:
-                    self.db.update_status(file_path, 'MANUAL_REVIEW', error="No PO Number found")
-                    logger.warning(f"⚠ Failed: Could not identify PO for {file_path}")
+    def _process_files_sequential(self, files, defer_ok: bool = True):
+        for file_path, doc_type, current_status in files:
+            po_number = self._resolve_po_number(file_path, doc_type, defer_ok)
+            # 2. Extract Line Items (YOLO Only)
+            if po_number and _yolo_extractor:
+                try:
+                    self._extract_line_items(file_path, doc_type, po_number)
+                except Exception as e:
+                    logger.error(f"CRITICAL ERROR processing {file_path}: {e}")
+                    self.db.update_status(file_path, 'FAILED', error=str(e))
 
-            except Exception as e:
-                logger.error(f"CRITICAL ERROR processing {file_path}: {e}")
-                self.db.update_status(file_path, 'FAILED', error=str(e))
+    def _process_deferred(self, limit: int = None, origin: str = 'inbox') -> int:
+        """
+        Low-concurrency pass for files DEFERRED by the memory governor: one
+        file at a time, no stage overlap. Waits while memory is still critical.
+        """
+        if governor.level() == 'hard':
+            return 0
+        deferred = self.db.get_deferred_files(limit, origin)
+        if not deferred:
+            return 0
+
+        logger.info(f"Processing {len(deferred)} deferred files one at a time...")
+        self._process_files_sequential(deferred, defer_ok=False)
+        metrics.set_gauge("queue_deferred", self.db.count_files('DEFERRED'))
+        return len(deferred)
+
+    def _resolve_po_number(self, file_path: str, doc_type: str, defer_ok: bool = True):
+        """Finds the PO number and records the outcome. Returns it, or None."""
+        if not os.path.exists(file_path):
+            logger.warning(f"👻 File vanished: {file_path}. Marking as FAILED.")
+            self.db.update_status(file_path, 'FAILED', error="File Not Found on Disk")
+            return None
+
+        if defer_ok and governor.should_defer(file_path):
+            logger.warning(f"🧯 Memory pressure: deferring {os.path.basename(file_path)} to a later pass.")
+            self.db.update_status(file_path, 'DEFERRED', error="Deferred: memory pressure")
+            return None
+
+        try:
+            self.db.update_status(file_path, 'PROCESSING')
+            
+            # 1. Extract PO Number
+            doc_info = get_document_info(file_path, doc_type)
+
+            if doc_info.po_number:
+                self.db.update_status(file_path, 'SUCCESS', po_number=doc_info.po_number)
+                logger.info(f"✓ Solved: {doc_type.upper()} -> PO: {doc_info.po_number}")
+                return doc_info.po_number
+
+            self.db.update_status(file_path, 'MANUAL_REVIEW', error="No PO Number found")
+            logger.warning(f"⚠ Failed: Could not identify PO for {file_path}")
 
-    def _step_merge_documents(self):
-        bundles = self.db.get_mergeable_bundles()
-        reconciler = Reconciler(self.db)
+        except Exception as e:
+            logger.error(f"CRITICAL ERROR processing {file_path}: {e}")
+            self.db.update_status(file_path, 'FAILED', error=str(e))
+        return None
+
+    def _process_files_staged(self, pending_files):
+        """
+        Runs the batch through four concurrent stages with bounded queues:
+          resolve : render + YOLO + OCR for the PO number (CPU)
+          tables  : render + YOLO table detection, one item per crop (CPU)
+          extract : Gemini line items per crop (network)
+          commit  : link + save line items per file (single DB writer)
+        """
+        engine = StagedPipeline([
+            StageSpec('resolve', self._stage_resolve, STAGE_WORKERS['resolve'], STAGE_QUEUE_SIZE),
+            StageSpec('tables', self._stage_tables, STAGE_WORKERS['tables'], STAGE_QUEUE_SIZE),
+            StageSpec('extract', self._stage_extract, STAGE_WORKERS['extract'], STAGE_QUEUE_SIZE),
+            StageSpec('commit', self._stage_commit, STAGE_WORKERS['commit'], STAGE_QUEUE_SIZE),
+        ], name="process")
+        engine.run(_FileJob(path, doc_type) for path, doc_type, _ in pending_files)
+
+    def _stage_resolve(self, job: _FileJob, emit):
+        job.po_number = self._resolve_po_number(job.file_path, job.doc_type)
+        if job.po_number and _yolo_extractor:
+            emit('tables', job)
+
+    def _stage_tables(self, job: _FileJob, emit):
+        try:
+            for crop_seq, (page_index, crop) in enumerate(_yolo_extractor.iter_table_crops(job.file_path, job.doc_type)):
+                job.add_crop()
+                emit('extract', (job, page_index, crop_seq, crop))
+        finally:
+            ready = job.close()
+
+        if not job.crops_emitted:
+            logger.warning(f"   No table found by YOLO for {job.file_path}. No line items.")
+        if ready:
+            # Committed even when empty: clears rows left by an earlier pass
+            emit('commit', job)
+
+    def _stage_extract(self, payload, emit):
+        job, page_index, crop_seq, crop = payload
+        rows = []
+        try:
+            json_str = self._read_table_crop(job.file_path, page_index, crop_seq, crop)
+            rows = self._parse_crop_rows(json_str, crop_seq)
+            self._check_template_crop(crop, rows)
+        finally:
+            if job.finish_crop(rows):
+                emit('commit', job)
+
+    def _stage_commit(self, job: _FileJob, emit):
+        self._save_line_items(job.file_path, job.doc_type, job.po_number,
+                              job.items, job.crops_emitted)
+
+    def _read_table_crop(self, file_path: str, page_index: int, crop_seq: int, crop) -> str:
+        """Gemini line items for one crop (recorded / replayed under REPLAY_MODE)."""
+        return fixtures.line_items(file_path, page_index, crop_seq,
+                                   lambda: extract_line_items_from_crop(crop))
+
+    def _check_template_crop(self, crop, rows: list):
+        """A crop cut from a cached layout that reads empty means the layout no longer fits."""
+        fingerprint = getattr(crop, 'info', {}).get(TEMPLATE_INFO_KEY)
+        if fingerprint is not None and not rows:
+            logger.info("   Cached table layout gave no line items; dropping the template.")
+            _yolo_extractor.reject_table_template(fingerprint)
+
+    def _parse_crop_rows(self, json_str: str, crop_seq: int) -> list:
+        try:
+            raw_data = json.loads(json_str)
+        except Exception as e:
+            logger.error(f"   Failed to parse API JSON: {e}")
+            return []
+        if not raw_data:
+            return []
+        # Stable (crop, row) key for idempotent storage
+        for row_idx, row in enumerate(raw_data):
+            row['page'] = crop_seq
+            row['row'] = row_idx
+        return raw_data
+
+    def _save_line_items(self, file_path: str, doc_type: str, po_number: str,
+                         all_extracted_items: list, crop_count: int):
+        linked_data = link_extracted_data(po_number, all_extracted_items) if all_extracted_items else []
+        for item in linked_data:
+            item['doc_type'] = doc_type
+
+        # Saved even when empty, so a reprocess that finds nothing drops the old rows
+        self.db.save_line_items(linked_data, file_id=self.db.get_file_id(file_path))
+        if linked_data:
+            logger.info(f"   + Extracted {len(linked_data)} items from {crop_count} tables.")
+        elif crop_count:
+            logger.warning(f"   YOLO found tables, but Gemini extracted 0 items.")
+
+    def _extract_line_items(self, file_path: str, doc_type: str, po_number: str):
+        """
+        Streams table crops into Gemini: pages are rendered and detected on a
+        producer thread while the API works on the crops already found, with
+        at most CROP_QUEUE_SIZE crops buffered in between.
+        """
+        all_extracted_items = []
+        crop_count = 0
+
+        crops = prefetch(_yolo_extractor.iter_table_crops(file_path, doc_type),
+                         maxsize=CROP_QUEUE_SIZE, name="yolo-crops")
+        for crop_seq, (page_index, crop) in enumerate(crops):
+            crop_count += 1
+            # Send to Cloud API
+            json_str = self._read_table_crop(file_path, page_index, crop_seq, crop)
+            rows = self._parse_crop_rows(json_str, crop_seq)
+            self._check_template_crop(crop, rows)
+            del crop
+            all_extracted_items.extend(rows)
+
+        if not crop_count:
+            logger.warning(f"   No table found by YOLO for {file_path}. No line items.")
+
+        self._save_line_items(file_path, doc_type, po_number, all_extracted_items, crop_count)
+
+    def _step_merge_documents(self, include_backfill: bool = False) -> int:
+        bundles = self.db.get_mergeable_bundles(include_backfill)
+        reconciler = self.reconciler
+        merged_count = 0
+        to_archive = []
         
         for po_number, files in bundles.items():
             sorted_files = sorted(
@@ -138,23 +358,73 @@ class PipelineOrchestrator:
                 logger.warning(f"⚠️ Merging {po_number} with warnings (Unsolicited items).")
 
             try:
-                merger = PdfWriter()
-                file_paths_used = []
-
-                for file_data in sorted_files:
-                    path = file_data['path']
-                    if not os.path.exists(path): continue
-                    merger.append(path)
-                    file_paths_used.append(path)
+                files_used = [f for f in sorted_files if os.path.exists(f['path'])]
+                if not files_used: continue
+                file_paths_used = [f['path'] for f in files_used]
 
-                if not file_paths_used: continue
+                existing = self.db.get_bundle(po_number) if INCREMENTAL_MERGE else None
+                if existing and os.path.exists(existing['output_path']):
+                    # Late arrival: add pages to the bundle already shipped.
+                    # Members already in it (e.g. a reprocessed file) are not appended twice.
+                    members = {m['file_path'] for m in self.db.get_bundle_members(po_number)}
+                    new_files = [f for f in files_used if f['path'] not in members]
+                    output_path = existing['output_path']
+                    if new_files:
+                        output_path = self._append_to_bundle(output_path, [f['path'] for f in new_files])
+                        self.db.record_bundle(po_number, output_path, new_files)
+                    logger.info(f"★ APPENDED: {po_number} (+{len(new_files)} docs) -> {output_path}")
+                else:
+                    merger = PdfWriter()
+                    for path in file_paths_used:
+                        merger.append(path)
+                    optimize_bundle(merger)
 
-                output_path = self.fs.save_merged_pdf(merger, po_number)
-                logger.info(f"★ MERGED: {po_number} ({len(sorted_files)} docs) -> {output_path}")
+                    output_path = self.fs.save_merged_pdf(merger, po_number)
+                    self.db.record_bundle(po_number, output_path, files_used, replace=True)
+                    logger.info(f"★ MERGED: {po_number} ({len(sorted_files)} docs) -> {output_path}")
+                    report_bundle_size(po_number, file_paths_used, output_path)
 
                 for path in file_paths_used:
                     self.db.update_status(path, 'MERGED')
-                    self.fs.move_to_archive(path) 
+                to_archive.extend(files_used)
+                merged_count += 1
 
             except Exception as e:
-                logger.error(f"Failed to merge bundle for PO {po_number}: {e}")
\ No newline at end of file
+                logger.error(f"Failed to merge bundle for PO {po_number}: {e}")
+
+        # One archive batch per pass (single index transaction).
+        # Backfilled files stay where they are: hardlinked into the store.
+        inbox = [f['path'] for f in to_archive if f.get('origin', 'inbox') == 'inbox']
+        backfill = [f['path'] for f in to_archive if f.get('origin', 'inbox') != 'inbox']
+        if inbox:
+            self.archive.archive_files(inbox)
+        if backfill:
+            self.archive.archive_files(backfill, keep_source=True)
+
+        metrics.set_gauge("queue_mergeable_pos", len(bundles) - merged_count)
+        return merged_count
+
+    def _append_to_bundle(self, output_path: str, file_paths: List[str]) -> str:
+        """
+        Appends pages to an existing Combined_PO file as a PDF incremental
+        update: the old pages are neither re-parsed nor re-written.
+        """
+        try:
+            writer = PdfWriter(output_path, incremental=True)
+        except TypeError:
+            # pypdf < 5.0 has no incremental mode: fall back to a full rewrite
+            logger.warning("pypdf without incremental support, rewriting bundle in full.")
+            writer = PdfWriter(clone_from=output_path)
+            for path in file_paths:
+                writer.append(path)
+            tmp_path = f"{output_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                writer.write(f)
+            os.replace(tmp_path, output_path)
+            return output_path
+
+        for path in file_paths:
+            writer.append(path)
+        appended = self.fs.append_to_merged_pdf(writer, output_path)
+        metrics.inc("bundle_bytes_appended", appended)
+        return output_path
\ No newline at end of file
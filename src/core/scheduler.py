@@ -0,0 +1,152 @@
+# The Daemon Scheduler
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Any
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One independently scheduled unit of work (scan, process, merge...).
+
+    `func` returns how much work it did. Work resets the stage to its minimum
+    interval and triggers its downstream stages; an idle run doubles the wait
+    up to `max_interval`.
+    """
+
+    def __init__(self, name: str, func: Callable[[], int], min_interval: float,
+                 max_interval: float, downstream: Optional[List[str]] = None):
+        self.name = name
+        self.func = func
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.downstream = downstream or []
+
+        self.interval = min_interval
+        self.next_run = 0.0
+        self.triggered_at: Optional[float] = None
+        self.runs = 0
+        self.last_work = 0
+        self.last_duration = 0.0
+        self.last_lag = 0.0
+        self.last_run_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "interval_s": round(self.interval, 2),
+            "runs": self.runs,
+            "last_work": self.last_work,
+            "last_duration_s": round(self.last_duration, 3),
+            "lag_s": round(self.last_lag, 3),
+            "last_run_at": self.last_run_at,
+            "next_run_in_s": round(max(0.0, self.next_run - time.time()), 2),
+        }
+
+
+class AdaptiveScheduler:
+    """
+    The 'Conductor' of the daemon.
+
+    Replaces the fixed run-then-sleep loop: every stage keeps its own clock,
+    backs off exponentially while idle and re-runs immediately when it (or an
+    upstream stage) finds work. When several stages are due, triggered ones go
+    first, then the one that has waited longest.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self._wakeup = threading.Event()
+        # Guards stage clocks: trigger() may come from worker threads
+        self._lock = threading.Lock()
+        self._stopped = False
+        metrics.register_collector("scheduler", self.snapshot)
+
+    def add_stage(self, stage: Stage):
+        self.stages[stage.name] = stage
+
+    def trigger(self, name: str):
+        """Makes a stage due now (safe to call from other threads)."""
+        stage = self.stages[name]
+        with self._lock:
+            now = time.time()
+            if stage.triggered_at is None:
+                stage.triggered_at = now
+            stage.interval = stage.min_interval
+            stage.next_run = min(stage.next_run, now)
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def run_forever(self):
+        logger.info(f"Scheduler started with stages: {', '.join(self.stages)}")
+        while not self._stopped:
+            with self._lock:
+                now = time.time()
+                due = [s for s in self.stages.values() if s.next_run <= now]
+                if due:
+                    # Triggered stages beat busy stages re-running themselves, so a
+                    # merge is not starved behind a long burst of processing batches.
+                    stage = min(due, key=lambda s: (s.triggered_at is None, self._due_since(s)))
+                else:
+                    wait = min(s.next_run for s in self.stages.values()) - now
+
+            if not due:
+                # A trigger() landing after the check sets the event: no lost wakeup,
+                # and one cleared early is caught by the re-check above
+                self._wakeup.wait(timeout=max(0.0, wait))
+                self._wakeup.clear()
+                continue
+
+            self._run_stage(stage)
+            metrics.dump()
+
+    def _due_since(self, stage: Stage) -> float:
+        if stage.triggered_at is not None:
+            return min(stage.triggered_at, stage.next_run)
+        return stage.next_run
+
+    def _run_stage(self, stage: Stage):
+        with self._lock:
+            start = time.time()
+            stage.last_lag = max(0.0, start - self._due_since(stage))
+            stage.triggered_at = None
+
+        try:
+            work = stage.func() or 0
+        except Exception as e:
+            logger.error(f"Stage '{stage.name}' crashed: {e}", exc_info=True)
+            work = 0
+
+        with self._lock:
+            end = time.time()
+            stage.runs += 1
+            stage.last_work = work
+            stage.last_duration = end - start
+            stage.last_run_at = end
+
+            if work:
+                # Busy: go again straight away
+                stage.interval = stage.min_interval
+                stage.next_run = end
+            elif stage.triggered_at is None:
+                stage.next_run = end + stage.interval
+                stage.interval = min(stage.interval * 2, stage.max_interval)
+            # else: triggered while running, stays due
+
+        if work:
+            # ... and wake everything downstream
+            for name in stage.downstream:
+                self.trigger(name)
+
+        metrics.set_gauge(f"stage_{stage.name}_lag_s", stage.last_lag)
+        metrics.set_gauge(f"stage_{stage.name}_duration_s", stage.last_duration)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: stage.as_dict() for name, stage in self.stages.items()}
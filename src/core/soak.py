@@ -0,0 +1,293 @@
+# The Soak Test Harness
+import os
+import json
+import time
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from .memory_governor import _read_rss_mb
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# Max growth per hour, fitted over the samples after the warm-up
+SOAK_MAX_RSS_MB_PER_H = float(os.getenv("SOAK_MAX_RSS_MB_PER_H", "20"))
+SOAK_MAX_FDS_PER_H = float(os.getenv("SOAK_MAX_FDS_PER_H", "5"))
+SOAK_MAX_DB_MB_PER_H = float(os.getenv("SOAK_MAX_DB_MB_PER_H", "25"))
+SOAK_MAX_LATENCY_S_PER_H = float(os.getenv("SOAK_MAX_LATENCY_S_PER_H", "2"))
+# Model loading, caches filling up etc. are not growth
+SOAK_WARMUP_MINUTES = float(os.getenv("SOAK_WARMUP_MINUTES", "10"))
+# Simulated Gemini response time
+SOAK_STUB_LATENCY = float(os.getenv("SOAK_STUB_LATENCY", "0.3"))
+POLL_SECONDS = 1.0
+
+# Every synthetic PO / DO / SI carries these lines, and the Gemini stub
+# returns them for every crop, so reconciliation matches and bundles merge.
+SYNTHETIC_LINES = [
+    {"line_ref": "1", "description": "Hex bolt M8 x 40", "part_no": "HB-840", "quantity": "100"},
+    {"line_ref": "2", "description": "Washer M8 zinc", "part_no": "WS-8", "quantity": "200"},
+    {"line_ref": "3", "description": "Nylon lock nut M8", "part_no": "LN-8", "quantity": "100"},
+]
+TITLES = {'po': "PURCHASE ORDER", 'do': "DELIVERY NOTE", 'si': "SALES INVOICE"}
+
+
+def make_synthetic_pdf(path: str, doc_type: str, po_number: str, serial: int):
+    """Writes a one-page text PDF shaped like a supplier document (atomically)."""
+    text = [f"PO {po_number}", TITLES[doc_type], "Soak Test Supplies LLC",
+            f"Reference SOAK-{serial}", "", "Line   Qty   Part No   Description"]
+    text += [f"{l['line_ref']}   {l['quantity']}   {l['part_no']}   {l['description']}" for l in SYNTHETIC_LINES]
+
+    def escape(s: str) -> str:
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    content = "BT /F1 11 Tf 50 790 Td 16 TL\n" + "".join(f"({escape(t)}) Tj T*\n" for t in text) + "ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        "/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(out)
+    os.replace(tmp_path, path)
+
+
+class GeminiStub:
+    """
+    Local stand-in for the Gemini REST API (generateContent). Point the
+    pipeline at it with GEMINI_API_ENDPOINT; it answers every table crop
+    with SYNTHETIC_LINES after SOAK_STUB_LATENCY seconds.
+    """
+
+    def __init__(self, latency: float = SOAK_STUB_LATENCY):
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                time.sleep(stub.latency)
+                stub.requests += 1
+
+                if "generateContent" not in self.path:
+                    self.send_error(404)
+                    return
+                body = json.dumps({
+                    "candidates": [{
+                        "content": {"role": "model", "parts": [{"text": json.dumps(SYNTHETIC_LINES)}]},
+                        "finishReason": "STOP",
+                        "index": 0,
+                    }]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.latency = latency
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="gemini-stub", daemon=True).start()
+        logger.info(f"Gemini stub listening on {self.endpoint}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def open_fd_count() -> Optional[int]:
+    try:
+        import psutil
+        process = psutil.Process()
+        return process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+    except ImportError:
+        pass
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def slope_per_hour(points: List[tuple]) -> Optional[float]:
+    """Least-squares slope of (hours, value) points."""
+    points = [(x, y) for x, y in points if y is not None]
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+class SoakTest:
+    """
+    The 'Endurance Run' for the daemon.
+
+    Runs the real --loop daemon (scheduler and all) on a background thread in
+    a scratch workspace, drops a synthetic PO + DO + SI bundle set into the
+    input folders every `feed_interval` seconds, and samples after every feed:
+      rss_mb, open fds, DB size, end-to-end latency (drop -> file processed),
+    plus how many files ended DEFERRED or failed since the last sample; only
+    SUCCESS / MERGED files count toward latency.
+    At the end, growth per hour is fitted over the post-warm-up samples and
+    compared with the SOAK_MAX_*_PER_H limits. Samples and the verdict are
+    written to soak_report.json as the run goes.
+    """
+
+    LIMITS = {
+        "rss_mb": SOAK_MAX_RSS_MB_PER_H,
+        "open_fds": SOAK_MAX_FDS_PER_H,
+        "db_mb": SOAK_MAX_DB_MB_PER_H,
+        "latency_s": SOAK_MAX_LATENCY_S_PER_H,
+    }
+
+    def __init__(self, orchestrator, hours: float, feed_interval: float = 30, bundles_per_feed: int = 1,
+                 report_path: str = "soak_report.json"):
+        self.orchestrator = orchestrator
+        self.duration = hours * 3600
+        self.feed_interval = feed_interval
+        self.bundles_per_feed = bundles_per_feed
+        self.report_path = report_path
+        self.db_path = orchestrator.db.db_path
+
+        self.samples: List[dict] = []
+        self._outstanding: Dict[str, float] = {}  # file_path -> dropped at
+        self._latencies: List[float] = []
+        self._deferred = 0
+        self._failed = 0
+        self._serial = 0
+        self._po_base = random.randint(0, 899999)
+
+    def run(self) -> bool:
+        """Returns True when every metric stayed within its slope limit."""
+        daemon = threading.Thread(target=self.orchestrator.run_daemon,
+                                  kwargs={"max_interval": 10, "min_interval": 1},
+                                  name="soak-daemon", daemon=True)
+        daemon.start()
+
+        start = time.time()
+        next_feed = start
+        try:
+            while time.time() - start < self.duration:
+                if time.time() >= next_feed:
+                    if self.samples or self._serial:
+                        self._sample(start)
+                    self._feed()
+                    next_feed += self.feed_interval
+                self._poll()
+                time.sleep(POLL_SECONDS)
+            self._sample(start)
+        finally:
+            scheduler = getattr(self.orchestrator, "scheduler", None)
+            if scheduler is not None:
+                scheduler.stop()
+            daemon.join(timeout=60)
+
+        verdict = self._evaluate()
+        self._write_report(verdict)
+        return verdict["passed"]
+
+    def _feed(self):
+        dirs = self.orchestrator.fs.dirs
+        for _ in range(self.bundles_per_feed):
+            self._serial += 1
+            po_number = f"90{(self._po_base + self._serial) % 1000000:06d}"
+            for doc_type in ('po', 'do', 'si'):
+                path = str(dirs[doc_type] / f"{doc_type.upper()}_SOAK_{po_number}_{self._serial}.pdf")
+                make_synthetic_pdf(path, doc_type, po_number, self._serial)
+                self._outstanding[path] = time.time()
+
+    def _poll(self):
+        if not self._outstanding:
+            return
+        statuses = self.orchestrator.db.get_file_statuses(list(self._outstanding))
+        now = time.time()
+        for path, status in statuses.items():
+            if status in ('PENDING', 'PROCESSING'):
+                continue
+            dropped_at = self._outstanding.pop(path)
+            if status in ('SUCCESS', 'MERGED'):
+                self._latencies.append(now - dropped_at)
+            elif status == 'DEFERRED':
+                self._deferred += 1
+            else:
+                # FAILED, MANUAL_REVIEW...: fast failures would flatter the latency
+                self._failed += 1
+
+    def _sample(self, start: float):
+        db_bytes = sum(os.path.getsize(p) for p in (self.db_path, f"{self.db_path}-wal") if os.path.exists(p))
+        latencies = sorted(self._latencies)
+        self._latencies = []
+        sample = {
+            "t_h": round((time.time() - start) / 3600, 4),
+            "rss_mb": _read_rss_mb(),
+            "open_fds": open_fd_count(),
+            "db_mb": round(db_bytes / (1024 * 1024), 3),
+            "latency_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+            "backlog": len(self._outstanding),
+            "deferred": self._deferred,
+            "failed": self._failed,
+        }
+        self._deferred = self._failed = 0
+        self.samples.append(sample)
+        logger.info(f"🧪 Soak t={sample['t_h']:.2f}h rss={sample['rss_mb'] or 0:.0f}MB "
+                    f"fds={sample['open_fds']} db={sample['db_mb']:.1f}MB "
+                    f"latency={sample['latency_s']}s backlog={sample['backlog']} "
+                    f"deferred={sample['deferred']} failed={sample['failed']}")
+        self._write_report(None)
+
+    def _evaluate(self) -> dict:
+        warm = [s for s in self.samples if s["t_h"] * 60 >= SOAK_WARMUP_MINUTES]
+        slopes, failures = {}, []
+        for key, limit in self.LIMITS.items():
+            slope = slope_per_hour([(s["t_h"], s[key]) for s in warm])
+            slopes[key] = None if slope is None else round(slope, 3)
+            if slope is not None and slope > limit:
+                failures.append(f"{key} grows {slope:.2f}/h (limit {limit}/h)")
+
+        for failure in failures:
+            logger.error(f"❌ Soak: {failure}")
+        if not warm:
+            logger.warning("Soak ended inside the warm-up window: nothing evaluated.")
+        elif not failures:
+            logger.info(f"✅ Soak passed: {slopes}")
+        return {"passed": not failures, "slopes_per_h": slopes, "failures": failures,
+                "evaluated_samples": len(warm)}
+
+    def _write_report(self, verdict: Optional[dict]):
+        report = {"limits_per_h": self.LIMITS, "warmup_minutes": SOAK_WARMUP_MINUTES,
+                  "deferred": sum(s["deferred"] for s in self.samples),
+                  "failed": sum(s["failed"] for s in self.samples),
+                  "samples": self.samples, "verdict": verdict}
+        tmp_path = f"{self.report_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        os.replace(tmp_path, self.report_path)
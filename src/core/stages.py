@@ -0,0 +1,156 @@
+# The Staged Execution Engine
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Any, Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class StageSpec:
+    """
+    One stage of a StagedPipeline.
+
+    `func(item, emit)` handles one item; it calls `emit(stage_name, item)` to
+    hand results to any later stage. `workers` threads pull from the stage's
+    bounded input queue, so a slow stage back-pressures everything upstream.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any, Callable], None],
+                 workers: int = 1, queue_size: int = 4):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # waiting on a full downstream queue
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, busy: float, blocked: float):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += busy - blocked
+            self.blocked_seconds += blocked
+
+
+class StagedPipeline:
+    """
+    The 'Assembly Line'.
+
+    Runs a fixed chain of stages concurrently with bounded queues between them,
+    so CPU-bound work (rendering, YOLO, OCR) overlaps with network-bound work
+    (Gemini) while memory stays capped by the queue sizes.
+
+    Utilization per stage = busy time / (workers x wall time), where time spent
+    blocked on a full downstream queue does not count as busy. The stage with
+    the highest utilization is the current bottleneck.
+    """
+
+    def __init__(self, stages: List[StageSpec], name: str = "pipeline"):
+        self.stages: Dict[str, StageSpec] = {s.name: s for s in stages}
+        self.order = [s.name for s in stages]
+        self.name = name
+
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._local = threading.local()
+        metrics.register_collector(f"stages_{name}", self.snapshot)
+
+    def run(self, items: Iterable[Any]) -> Dict[str, Any]:
+        """Feeds `items` into the first stage and blocks until everything drains."""
+        self._started_at = time.time()
+        self._finished_at = None
+
+        threads = []
+        for stage in self.stages.values():
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._worker, args=(stage,),
+                                     name=f"{self.name}-{stage.name}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        first = self.order[0]
+        for item in items:
+            self.emit(first, item)
+
+        # Wait until no item is queued or being worked on anywhere
+        with self._cond:
+            while self._inflight:
+                self._cond.wait()
+
+        for stage in self.stages.values():
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+        for t in threads:
+            t.join()
+
+        self._finished_at = time.time()
+        report = self.snapshot()
+        if report.get("bottleneck"):
+            logger.info(f"Stage bottleneck this run: {report['bottleneck']}")
+        return report
+
+    def emit(self, stage_name: str, item: Any):
+        """Queues an item for a stage (blocks while that stage's queue is full)."""
+        stage = self.stages[stage_name]
+        with self._cond:
+            self._inflight += 1
+        start = time.perf_counter()
+        stage.queue.put(item)
+        # Charge backpressure to the calling stage, not to its busy time
+        if getattr(self._local, "blocked", None) is not None:
+            self._local.blocked += time.perf_counter() - start
+        depth = stage.queue.qsize()
+        if depth > stage.max_depth:
+            stage.max_depth = depth
+
+    def _worker(self, stage: StageSpec):
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                return
+
+            self._local.blocked = 0.0
+            start = time.perf_counter()
+            try:
+                stage.func(item, self.emit)
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' failed on item: {e}", exc_info=True)
+            finally:
+                stage.record(time.perf_counter() - start, self._local.blocked)
+                with self._cond:
+                    self._inflight -= 1
+                    if not self._inflight:
+                        self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        if self._started_at is None:
+            return {}
+
+        wall = (self._finished_at or time.time()) - self._started_at
+        stages = {}
+        for name in self.order:
+            s = self.stages[name]
+            utilization = s.busy_seconds / (s.workers * wall) if wall > 0 else 0.0
+            stages[name] = {
+                "workers": s.workers,
+                "processed": s.processed,
+                "busy_s": round(s.busy_seconds, 3),
+                "blocked_s": round(s.blocked_seconds, 3),
+                "utilization": round(utilization, 3),
+                "queue_depth": s.queue.qsize(),
+                "queue_max_depth": s.max_depth,
+            }
+
+        bottleneck = max(stages, key=lambda n: stages[n]["utilization"]) if stages else None
+        return {"wall_s": round(wall, 3), "bottleneck": bottleneck, "stages": stages}
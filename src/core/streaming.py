@@ -0,0 +1,64 @@
+# Streaming Helpers
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def prefetch(iterable: Iterable[T], maxsize: int = 2, name: str = "prefetch") -> Iterator[T]:
+    """
+    Runs `iterable` on a background thread and yields its items through a
+    bounded queue, so the producer (e.g. page rendering + YOLO) keeps working
+    while the consumer (e.g. Gemini calls) waits on I/O.
+
+    At most `maxsize` items are buffered; the producer blocks beyond that.
+    Producer exceptions are re-raised in the consumer. If the consumer stops
+    early, the producer is told to stop at its next item.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def _produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            _put_final(e)
+            return
+        finally:
+            close = getattr(iterable, "close", None)
+            if stop.is_set() and close:
+                close()
+        _put_final(_DONE)
+
+    def _put_final(marker):
+        while not stop.is_set():
+            try:
+                buffer.put(marker, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    worker = threading.Thread(target=_produce, name=name, daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
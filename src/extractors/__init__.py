@@ -1,49 +1,133 @@
 import logging
 import os
-from typing import Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
 
 from .models import DocumentInfo
 
 from .text_extractors.digital import FastDigitalExtractor
 from .text_extractors.ocr import RapidOCRExtractor
-from .text_extractors.yolo_extractor import YoloExtractor 
+from .text_extractors.yolo_extractor import YoloExtractor, YOLO_MODEL_PATH
+from .inference_server import InferenceClient, RemoteYoloExtractor, RemoteOCRExtractor
+from .replay import fixtures
 
 from .po_finder import heuristics
+from src.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# --- CONSTANTS ---
+# Run the text-layer probe alongside YOLO instead of after it
+SPECULATIVE_PO = os.getenv("SPECULATIVE_PO", "1") == "1"
+# Max speculative probes running at once (process-wide); beyond that,
+# documents fall back to the sequential order instead of queueing.
+SPECULATION_SLOTS = int(os.getenv("SPECULATION_SLOTS", "2"))
+
 # --- INITIALIZATION ---
-_fast_extractor = FastDigitalExtractor()
-_ocr_extractor = RapidOCRExtractor()
+# Extractors whose outputs are replayed (REPLAY_MODE=replay) are never
+# built: no ONNX sessions, no YOLO weights, no inference server lookup.
+_fast_extractor = None if fixtures.replays('digital') else FastDigitalExtractor()
+
+def _local_yolo():
+    return YoloExtractor(model_path=YOLO_MODEL_PATH, target_class_id=1)
+
+# A warm inference server (cli.py serve) saves the model load on short runs
+_models_needed = not (fixtures.replays('ocr') and fixtures.replays('yolo'))
+_inference_client = InferenceClient.connect_if_available() if _models_needed else None
+
+if fixtures.replays('ocr'):
+    _ocr_extractor = None
+elif _inference_client:
+    _ocr_extractor = RemoteOCRExtractor(_inference_client, RapidOCRExtractor)
+else:
+    _ocr_extractor = RapidOCRExtractor()
 
-YOLO_MODEL_PATH = "po_detector.pt"
-if os.path.exists(YOLO_MODEL_PATH):
-    _yolo_extractor = YoloExtractor(model_path=YOLO_MODEL_PATH, target_class_id=1) 
+if fixtures.replays('yolo'):
+    _yolo_extractor = None
+elif _inference_client and _inference_client.capabilities.get('yolo'):
+    _yolo_extractor = RemoteYoloExtractor(_inference_client, _local_yolo)
+    logger.info("YOLOv8 served by the inference server.")
+elif os.path.exists(YOLO_MODEL_PATH):
+    _yolo_extractor = _local_yolo() 
     logger.info(f"YOLOv8 loaded from {YOLO_MODEL_PATH}")
 else:
     _yolo_extractor = None
     logger.warning(f"YOLO model not found at {os.path.abspath(YOLO_MODEL_PATH)}.")
 
+# REPLAY_MODE=record|replay: capture or play back every extractor output
+_fast_extractor = fixtures.wrap('digital', _fast_extractor)
+_ocr_extractor = fixtures.wrap('ocr', _ocr_extractor)
+_yolo_extractor = fixtures.wrap('yolo', _yolo_extractor)
+
+_speculation_pool = ThreadPoolExecutor(max_workers=max(1, SPECULATION_SLOTS), thread_name_prefix="po-speculation")
+_speculation_slots = threading.BoundedSemaphore(max(1, SPECULATION_SLOTS))
+
+def yolo_ready() -> bool:
+    """True when YOLO can run (model found and its dependencies load)."""
+    if isinstance(_yolo_extractor, YoloExtractor):
+        _yolo_extractor._load_models()
+        return _yolo_extractor.yolo_model is not None
+    return _yolo_extractor is not None
+
+def _digital_probe(file_path: str, cancel: Optional[threading.Event] = None) -> Tuple[Optional[str], bool]:
+    """
+    Text layer search. Returns (po_number, confident); a hit is confident when
+    it matches one of the strict PO patterns exactly. A confident hit sets
+    `cancel` so a YOLO run in progress stops early.
+    """
+    extracted_text = _fast_extractor.extract(file_path)
+    po_number = heuristics.find_po_number_in_text(extracted_text)
+    confident = bool(po_number) and heuristics.apply_strict_patterns(po_number) == po_number
+    if confident and cancel is not None:
+        cancel.set()
+    return po_number, confident
+
+def _speculate_digital(file_path: str, cancel: threading.Event) -> Optional[Future]:
+    """Starts the digital probe on a free slot. Returns None when all slots are busy."""
+    if not _speculation_slots.acquire(blocking=False):
+        metrics.inc("po_speculation_skipped")
+        return None
+    future = _speculation_pool.submit(_digital_probe, file_path, cancel)
+    # The slot is held for as long as the probe really runs
+    future.add_done_callback(lambda _: _speculation_slots.release())
+    return future
+
 def get_document_info(file_path: str, doc_type: str) -> DocumentInfo:
     """
     The Main Public Facade (V1.5 - Optimized Sniper).
+
+    Speculative mode: the text-layer probe starts together with YOLO. A YOLO
+    hit still wins; a confident digital hit cancels YOLO mid-way, and on a
+    YOLO miss the digital answer is already there instead of starting cold.
     """
     po_number = None
+    cancel = threading.Event()
+    digital = None
+
+    if SPECULATIVE_PO and _yolo_extractor and doc_type != 'do':
+        digital = _speculate_digital(file_path, cancel)
     
     # --- STRATEGY 1: The Specialist (YOLO) ---
     if _yolo_extractor:
-        yolo_text = _yolo_extractor.extract(file_path)
+        yolo_text = _yolo_extractor.extract(file_path, cancel=cancel, doc_type=doc_type)
         po_number = heuristics.rescue_yolo_hit(yolo_text)
         
         if po_number:
+             if digital is not None:
+                 digital.cancel()  # no-op if already running; its answer is ignored
              logger.info(f"YOLO Hit: {po_number}")
              return DocumentInfo(file_path, doc_type, po_number)
 
     # --- STRATEGY 2: The Fast Track (Digital) ---
     # Good for digital PDFs if YOLO somehow misses
     if doc_type != 'do':
-        extracted_text = _fast_extractor.extract(file_path)
-        po_number = heuristics.find_po_number_in_text(extracted_text)
+        if digital is not None:
+            po_number, _ = digital.result()
+            if cancel.is_set():
+                metrics.inc("po_speculation_wins")
+        else:
+            po_number, _ = _digital_probe(file_path)
         if po_number:
             logger.info(f"Digital Fast Track Hit: {po_number}")
             return DocumentInfo(file_path, doc_type, po_number)
@@ -7,18 +7,38 @@ from dotenv import load_dotenv
 import time
 import json
 
+from src.core.metrics import metrics
+from .model_health import ModelHealthTracker
+
 # Configure Logging
 logger = logging.getLogger(__name__)
 
 # Load Environment Variables
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
+# Alternative endpoint (REST), e.g. the local stub used by `cli.py soak`
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
 
 if not API_KEY:
     logger.warning("⚠️ GEMINI_API_KEY not found in .env file. API features will fail.")
 
 # Configure Gemini
-genai.configure(api_key=API_KEY)
+if GEMINI_API_ENDPOINT:
+    genai.configure(api_key=API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+else:
+    genai.configure(api_key=API_KEY)
+
+# Priority list (tried in this order until the health tracker learns better)
+CANDIDATE_MODELS = [
+    'gemini-2.5-flash',      
+    'gemini-2.0-flash',      
+    'gemini-flash-latest',
+    'gemini-1.5-flash-latest'
+]
+
+# Per-process circuit breaker shared by every crop
+_model_health = ModelHealthTracker()
+metrics.register_collector("gemini_models", _model_health.snapshot)
 
 def debug_print_models():
     """Helper to list all models available to your specific API Key."""
@@ -36,14 +56,6 @@ def extract_line_items_from_crop(image: Image.Image, retry_count=0):
     Sends a TABLE CROP image to Gemini Flash to extract line items.
     Used in the 'Crop & Link' strategy.
     """
-    # Priority list
-    candidate_models = [
-        'gemini-2.5-flash',      
-        'gemini-2.0-flash',      
-        'gemini-flash-latest',
-        'gemini-1.5-flash-latest'
-    ]
-
     # --- THE CROP-SPECIFIC PROMPT ---
     prompt = """
     You are an expert data extraction agent. 
@@ -75,39 +87,66 @@ def extract_line_items_from_crop(image: Image.Image, retry_count=0):
         HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
     }
 
-    for model_name in candidate_models:
-        try:
-            logger.info(f"🤖 Sending table crop to model: {model_name}")
-            model = genai.GenerativeModel(model_name)
-            
-            response = model.generate_content(
-                [prompt, image],
-                safety_settings=safety_settings
-            )
-            
-            raw_text = response.text
-            
-            # Sanitize the output
-            clean_json = raw_text.replace("```json", "").replace("```", "").strip()
-            
-            if clean_json:
-                if "[" in clean_json and "]" in clean_json:
-                    return clean_json
+    # Skips open circuits and puts the fastest healthy model first
+    planned_models = _model_health.plan(CANDIDATE_MODELS)
+    attempted = set()
+
+    def release_unattempted():
+        # plan() claims the probe slot of every half-open model it returns;
+        # hand back the ones this call never got to.
+        for name in planned_models:
+            if name not in attempted:
+                attempted.add(name)
+                _model_health.release(name)
+
+    try:
+        for model_name in planned_models:
+            attempted.add(model_name)
+            try:
+                logger.info(f"🤖 Sending table crop to model: {model_name}")
+                model = genai.GenerativeModel(model_name)
+                
+                start = time.perf_counter()
+                response = model.generate_content(
+                    [prompt, image],
+                    safety_settings=safety_settings
+                )
+                
+                raw_text = response.text
+                
+                # Sanitize the output
+                clean_json = raw_text.replace("```json", "").replace("```", "").strip()
+                
+                if clean_json:
+                    if "[" in clean_json and "]" in clean_json:
+                        _model_health.record_success(model_name, time.perf_counter() - start)
+                        return clean_json
+                    else:
+                        logger.warning(f"Model {model_name} returned invalid JSON: {clean_json[:50]}...")
+                        _model_health.record_failure(model_name, "Invalid JSON")
+                else:
+                    logger.warning(f"Model {model_name} returned empty text.")
+                    _model_health.record_failure(model_name, "Empty response")
+                
+            except Exception as e:
+                if "429" in str(e): # Rate Limit
+                    # Quota problem, not a broken model: don't trip the breaker,
+                    # and hand back any probe slots the retry will re-plan.
+                    _model_health.release(model_name)
+                    release_unattempted()
+                    if retry_count < 3:
+                        wait_time = (2 ** retry_count) + 1
+                        logger.warning(f"Rate limit (429). Retrying in {wait_time}s...")
+                        time.sleep(wait_time)
+                        return extract_line_items_from_crop(image, retry_count + 1)
+                
                 else:
-                    logger.warning(f"Model {model_name} returned invalid JSON: {clean_json[:50]}...")
-            else:
-                logger.warning(f"Model {model_name} returned empty text.")
-            
-        except Exception as e:
-            if "429" in str(e): # Rate Limit
-                if retry_count < 3:
-                    wait_time = (2 ** retry_count) + 1
-                    logger.warning(f"Rate limit (429). Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    return extract_line_items_from_crop(image, retry_count + 1)
-            
-            logger.error(f"Error with {model_name}: {e}")
-            continue
+                    _model_health.record_failure(model_name, str(e))
+                
+                logger.error(f"Error with {model_name}: {e}")
+                continue
+    finally:
+        release_unattempted()
 
     logger.error("❌ All Gemini models failed to read the table crop.")
     return "[]"
\ No newline at end of file
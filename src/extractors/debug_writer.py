@@ -0,0 +1,139 @@
+import os
+import queue
+import random
+import fnmatch
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# off    : never write debug images
+# sample : write for a random fraction of files (YOLO_DEBUG_SAMPLE_RATE)
+# all    : write for every file
+DEBUG_MODE = os.getenv("YOLO_DEBUG_MODE", "sample").lower()
+DEBUG_SAMPLE_RATE = float(os.getenv("YOLO_DEBUG_SAMPLE_RATE", "0.01"))
+# Comma separated filename globs that are always written, whatever the mode
+DEBUG_FILE_PATTERNS = [p.strip() for p in os.getenv("YOLO_DEBUG_FILES", "").split(",") if p.strip()]
+DEBUG_OUTPUT_DIR = os.getenv("YOLO_DEBUG_DIR", "debug_yolo_crops")
+DEBUG_QUEUE_SIZE = int(os.getenv("YOLO_DEBUG_QUEUE_SIZE", "16"))
+DEBUG_MAX_FILES = int(os.getenv("YOLO_DEBUG_MAX_FILES", "500"))
+DEBUG_MAX_MB = float(os.getenv("YOLO_DEBUG_MAX_MB", "200"))
+
+
+class DebugImageWriter:
+    """
+    The 'Flight Recorder' for YOLO detections.
+
+    Keeps debug output off the hot path:
+    - Sampling decides up front whether a file is recorded at all.
+    - Encoding (result.plot) and disk writes happen on a background thread.
+    - The queue is bounded; when it is full the image is dropped, never waited on.
+    - Retention keeps the folder under a file count and total size cap.
+    """
+
+    def __init__(self, output_dir: str = DEBUG_OUTPUT_DIR, mode: str = DEBUG_MODE,
+                 sample_rate: float = DEBUG_SAMPLE_RATE, file_patterns: Optional[list] = None):
+        self.output_dir = output_dir
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.file_patterns = file_patterns if file_patterns is not None else DEBUG_FILE_PATTERNS
+        self.max_files = DEBUG_MAX_FILES
+        self.max_bytes = int(DEBUG_MAX_MB * 1024 * 1024)
+
+        self._queue = queue.Queue(maxsize=DEBUG_QUEUE_SIZE)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._retained = OrderedDict()  # path -> size, oldest first
+        self._retained_bytes = 0
+
+    def should_record(self, file_path: str) -> bool:
+        """Decides once per file whether its pages get debug images."""
+        name = os.path.basename(file_path)
+        if any(fnmatch.fnmatch(name, pat) for pat in self.file_patterns):
+            return True
+        if self.mode == "all":
+            return True
+        if self.mode == "sample":
+            return random.random() < self.sample_rate
+        return False
+
+    def submit(self, filename: str, render: Callable):
+        """
+        Queues a debug image. `render` is called on the worker thread and must
+        return a BGR numpy array (e.g. `result.plot`).
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((filename, render))
+        except queue.Full:
+            metrics.inc("debug_images_dropped")
+
+    def flush(self):
+        """Blocks until queued images are written (used at shutdown)."""
+        if self._worker:
+            self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker and self._worker.is_alive():
+                return
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._load_existing()
+            self._worker = threading.Thread(target=self._run, name="yolo-debug-writer", daemon=True)
+            self._worker.start()
+
+    def _load_existing(self):
+        """Seeds retention with files left over from earlier runs."""
+        self._retained.clear()
+        self._retained_bytes = 0
+        try:
+            entries = [e for e in os.scandir(self.output_dir) if e.is_file()]
+        except OSError:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries:
+            self._track(entry.path, entry.stat().st_size)
+        self._enforce_retention()
+
+    def _run(self):
+        import cv2
+
+        while True:
+            filename, render = self._queue.get()
+            try:
+                path = os.path.join(self.output_dir, filename)
+                if cv2.imwrite(path, render()):
+                    self._track(path, os.path.getsize(path))
+                    self._enforce_retention()
+                    metrics.inc("debug_images_written")
+                    logger.debug(f"Saved YOLO debug image to {path}")
+            except Exception as e:
+                logger.debug(f"Debug image write failed for {filename}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _track(self, path: str, size: int):
+        """Records a written file as the newest; a rewrite replaces its old entry."""
+        self._retained_bytes += size - self._retained.pop(path, 0)
+        self._retained[path] = size
+
+    def _enforce_retention(self):
+        while self._retained and (len(self._retained) > self.max_files
+                                  or self._retained_bytes > self.max_bytes):
+            path, size = self._retained.popitem(last=False)
+            self._retained_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        metrics.set_gauge("debug_images_retained", len(self._retained))
+        metrics.set_gauge("debug_images_bytes", self._retained_bytes)
+
+
+# Process-wide writer
+debug_writer = DebugImageWriter()
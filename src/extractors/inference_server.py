@@ -0,0 +1,310 @@
+import os
+import logging
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client
+from typing import Optional, Tuple, Union
+
+from .base import BaseTextExtractor
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# Private per-user folder holding the socket and the generated key (mode 0700)
+INFERENCE_DIR = os.getenv("INFERENCE_DIR", os.path.join(os.path.expanduser("~"), ".pdf_merger"))
+# "host:port" for TCP, or a filesystem path for a Unix socket.
+# Default: a Unix socket in INFERENCE_DIR (TCP on localhost on Windows).
+INFERENCE_SERVER_ADDRESS = os.getenv(
+    "INFERENCE_SERVER_ADDRESS",
+    "127.0.0.1:47321" if os.name == "nt" else os.path.join(INFERENCE_DIR, "inference.sock"),
+)
+# Requests are unpickled, so the key is what stands between other local
+# users and code execution in the server. Without INFERENCE_AUTHKEY the
+# server writes a random one to INFERENCE_KEY_FILE (0600) for clients to read.
+INFERENCE_KEY_FILE = os.path.join(INFERENCE_DIR, "inference.key")
+# Set to 0 to never look for a server (always load models in-process)
+USE_INFERENCE_SERVER = os.getenv("USE_INFERENCE_SERVER", "1") == "1"
+
+
+def _private_dir():
+    os.makedirs(INFERENCE_DIR, mode=0o700, exist_ok=True)
+    if os.name != "nt":
+        os.chmod(INFERENCE_DIR, 0o700)
+
+
+def _create_authkey() -> bytes:
+    """Server side: the configured secret, or a fresh random key written to INFERENCE_KEY_FILE."""
+    configured = os.getenv("INFERENCE_AUTHKEY")
+    if configured:
+        return configured.encode()
+
+    _private_dir()
+    key = secrets.token_hex(32)
+    tmp_path = f"{INFERENCE_KEY_FILE}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    os.replace(tmp_path, INFERENCE_KEY_FILE)
+    return key.encode()
+
+
+def _read_authkey() -> Optional[bytes]:
+    """Client side: the configured secret, or the key left by a running server."""
+    configured = os.getenv("INFERENCE_AUTHKEY")
+    if configured:
+        return configured.encode()
+    try:
+        with open(INFERENCE_KEY_FILE, encoding="utf-8") as f:
+            return f.read().strip().encode() or None
+    except OSError:
+        return None
+
+
+def _parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    if "/" in address or "\\" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+class InferenceServer:
+    """
+    The 'Warm Engine Room'.
+
+    A long-lived process that loads YOLO + RapidOCR once and serves
+    detection/OCR requests to short-lived pipeline runs on the same machine.
+    Requests carry file paths (not bitmaps); the server renders the PDF itself.
+    Connections get a thread each, but requests are computed one at a time
+    (YOLO, RapidOCR and PDFium are not safe to drive from several threads);
+    only sending the replies overlaps.
+
+    Protocol (pickled tuples over multiprocessing.connection):
+      ('ping',)                  -> ('ok', {'yolo': bool, 'ocr': bool})
+      ('po_text', path, doc_type)     -> ('ok', str)
+      ('ocr_text', path)         -> ('ok', str)
+      ('table_crops', path, doc_type) -> ('crop', page, PIL.Image)* then ('end',)
+      ('reject_table', fingerprint)  -> ('ok', None)
+    """
+
+    def __init__(self, address: str = INFERENCE_SERVER_ADDRESS, model_path: Optional[str] = None):
+        from .text_extractors.ocr import RapidOCRExtractor
+        from .text_extractors.yolo_extractor import YoloExtractor, YOLO_MODEL_PATH
+
+        model_path = model_path or YOLO_MODEL_PATH
+        self.address = _parse_address(address)
+        self._work_lock = threading.Lock()
+        self.ocr = RapidOCRExtractor()
+        self.yolo = None
+        if os.path.exists(model_path):
+            self.yolo = YoloExtractor(model_path=model_path, target_class_id=1)
+            self.yolo._load_models()  # warm up now, not on the first request
+        else:
+            logger.warning(f"YOLO model not found at {os.path.abspath(model_path)}; serving OCR only.")
+
+    def serve_forever(self):
+        authkey = _create_authkey()
+        if isinstance(self.address, str):
+            if os.path.abspath(os.path.dirname(self.address)) == os.path.abspath(INFERENCE_DIR):
+                _private_dir()
+            if os.path.exists(self.address):
+                os.remove(self.address)  # stale Unix socket from a previous run
+        elif self.address[0] not in ("127.0.0.1", "localhost", "::1"):
+            logger.warning(f"Inference server bound to {self.address[0]}: reachable from other machines.")
+
+        with Listener(self.address, authkey=authkey) as listener:
+            if isinstance(self.address, str):
+                os.chmod(self.address, 0o600)
+            logger.info(f"🔥 Inference server listening on {INFERENCE_SERVER_ADDRESS}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.error(f"Rejected inference connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    self._dispatch(conn, request)
+                except (EOFError, OSError):
+                    return  # client went away mid-reply
+                except Exception as e:
+                    logger.error(f"Inference request {request[:1]} failed: {e}")
+                    try:
+                        conn.send(('error', str(e)))
+                    except (EOFError, OSError):
+                        return
+
+    def _dispatch(self, conn, request):
+        command = request[0]
+        if command == 'ping':
+            conn.send(('ok', {'yolo': self.yolo is not None, 'ocr': self.ocr._model_loaded}))
+            return
+        if command not in ('po_text', 'ocr_text', 'table_crops', 'reject_table'):
+            conn.send(('error', f"Unknown command: {command}"))
+            return
+
+        # Computed under the lock, sent outside it: a slow client never
+        # holds up the others (a document's crops are a few small images)
+        with self._work_lock:
+            if command == 'po_text':
+                reply = [('ok', self.yolo.extract(request[1], doc_type=request[2]) if self.yolo else "")]
+            elif command == 'ocr_text':
+                reply = [('ok', self.ocr.extract(request[1]))]
+            elif command == 'reject_table':
+                if self.yolo:
+                    self.yolo.reject_table_template(tuple(request[1]))
+                reply = [('ok', None)]
+            else:
+                crops = list(self.yolo.iter_table_crops(request[1], request[2])) if self.yolo else []
+                reply = [('crop', page_index, crop) for page_index, crop in crops] + [('end',)]
+
+        for message in reply:
+            conn.send(message)
+
+
+class InferenceClient:
+    """Per-thread connections to a running InferenceServer."""
+
+    def __init__(self, address: str = INFERENCE_SERVER_ADDRESS):
+        self.address = _parse_address(address)
+        self.authkey = _read_authkey()
+        self._local = threading.local()
+        self.capabilities = {}
+
+    @classmethod
+    def connect_if_available(cls) -> Optional["InferenceClient"]:
+        """Returns a client if a server answers, otherwise None (use local models)."""
+        if not USE_INFERENCE_SERVER:
+            return None
+        client = cls()
+        if client.authkey is None:
+            return None  # no server has run as this user (or no INFERENCE_AUTHKEY)
+        try:
+            client.capabilities = client.call('ping')
+        except Exception:
+            return None
+        logger.info(f"Using inference server at {INFERENCE_SERVER_ADDRESS} ({client.capabilities}).")
+        return client
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, *request):
+        try:
+            conn = self._conn()
+            conn.send(request)
+            reply = conn.recv()
+        except Exception:
+            self._drop()
+            raise
+        if reply[0] == 'error':
+            raise RuntimeError(reply[1])
+        return reply[1]
+
+    def stream(self, *request):
+        try:
+            conn = self._conn()
+            conn.send(request)
+            while True:
+                reply = conn.recv()
+                if reply[0] == 'end':
+                    return
+                if reply[0] == 'error':
+                    raise RuntimeError(reply[1])
+                yield reply[1:]
+        except GeneratorExit:
+            # Consumer stopped early: the rest of the stream is unread, so
+            # this connection can't be reused.
+            self._drop()
+            raise
+        except Exception:
+            self._drop()
+            raise
+
+
+class _RemoteExtractor(BaseTextExtractor):
+    """Sends work to the inference server; switches to in-process models if it goes away."""
+
+    def __init__(self, client: InferenceClient, local_factory):
+        self.client = client
+        self._local_factory = local_factory
+        self._local = None
+        self._lock = threading.Lock()
+
+    def _fallback(self, error: Exception):
+        with self._lock:
+            if self._local is None:
+                logger.warning(f"Inference server unavailable ({error}); loading models in-process.")
+                self._local = self._local_factory()
+        return self._local
+
+
+class RemoteYoloExtractor(_RemoteExtractor):
+    def extract(self, file_path: str, cancel: Optional[threading.Event] = None,
+                doc_type: Optional[str] = None) -> str:
+        # A server-side request can't be interrupted; `cancel` only reaches local models
+        if self._local is None:
+            try:
+                return self.client.call('po_text', os.path.abspath(file_path), doc_type)
+            except (OSError, EOFError) as e:
+                self._fallback(e)
+        return self._local.extract(file_path, cancel=cancel, doc_type=doc_type)
+
+    def iter_table_crops(self, file_path: str, doc_type: Optional[str] = None):
+        sent = 0
+        if self._local is None:
+            try:
+                for page_index, crop in self.client.stream('table_crops', os.path.abspath(file_path), doc_type):
+                    sent += 1
+                    yield page_index, crop
+                return
+            except (OSError, EOFError) as e:
+                self._fallback(e)
+        # Resume locally without repeating crops the server already delivered
+        for n, item in enumerate(self._local.iter_table_crops(file_path, doc_type)):
+            if n >= sent:
+                yield item
+
+    def reject_table_template(self, fingerprint):
+        # The server owns the layout cache its crops came from
+        if self._local is None:
+            try:
+                self.client.call('reject_table', fingerprint)
+                return
+            except (OSError, EOFError) as e:
+                self._fallback(e)
+        self._local.reject_table_template(fingerprint)
+
+    def extract_all_table_crops(self, file_path: str) -> list:
+        return [crop for _, crop in self.iter_table_crops(file_path)]
+
+
+class RemoteOCRExtractor(_RemoteExtractor):
+    def extract(self, file_path: str) -> str:
+        if self._local is None:
+            try:
+                return self.client.call('ocr_text', os.path.abspath(file_path))
+            except (OSError, EOFError) as e:
+                self._fallback(e)
+        return self._local.extract(file_path)
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+LAYOUT_CACHE = os.getenv("LAYOUT_CACHE", "1") == "1"
+LAYOUT_CACHE_PATH = os.getenv("LAYOUT_CACHE_PATH", "layout_templates.json")
+# Max differing bits (of 64) between two first-page thumbnails of one layout
+LAYOUT_MAX_DISTANCE = int(os.getenv("LAYOUT_MAX_DISTANCE", "6"))
+# Documents that must agree on the same boxes before detection is skipped
+LAYOUT_MIN_CONFIRMATIONS = int(os.getenv("LAYOUT_MIN_CONFIRMATIONS", "3"))
+# Every Nth cache hit runs YOLO anyway, so a changed layout is re-learned
+LAYOUT_RECHECK_EVERY = int(os.getenv("LAYOUT_RECHECK_EVERY", "25"))
+LAYOUT_MAX_TEMPLATES = int(os.getenv("LAYOUT_MAX_TEMPLATES", "500"))
+# Tables grow with the row count: a table box is only cached / reused while
+# at least this much blank space (fraction of page height) follows it
+LAYOUT_TABLE_MIN_GAP = float(os.getenv("LAYOUT_TABLE_MIN_GAP", "0.01"))
+# The box edge itself may sit on the table's bottom rule
+TABLE_EDGE_SKIP = 0.003
+INK_THRESHOLD = 160
+# Two boxes are "the same" above this intersection-over-union
+BOX_MATCH_IOU = 0.8
+
+Box = Tuple[float, float, float, float]  # x1, y1, x2, y2 as fractions of the page
+Fingerprint = Tuple[Optional[str], float, int]  # doc_type, aspect, dhash
+# PIL Image.info key marking a table crop cut from a cached template
+TEMPLATE_INFO_KEY = "layout_fingerprint"
+
+
+def layout_fingerprint(image: np.ndarray, doc_type: Optional[str] = None) -> Fingerprint:
+    """
+    Cheap first-page signature: document type, page aspect ratio and a 64-bit
+    difference hash of a 9x8 grayscale thumbnail. Letterheads, logos and ruled
+    boxes dominate the thumbnail, so documents from one supplier template land
+    a few bits apart; the type and aspect keep a look-alike PO / DO / SI or
+    page format from borrowing another layout's boxes.
+    `image` is the rendered page array (H x W or H x W x C); it is subsampled
+    by striding, so the full page is never copied.
+    """
+    height, width = image.shape[:2]
+    step = max(1, min(height, width) // 64)
+    small = image[::step, ::step].astype(np.float32)
+    if small.ndim == 3:
+        small = small.mean(axis=2)
+
+    rows = np.linspace(0, small.shape[0], 9).astype(int)
+    cols = np.linspace(0, small.shape[1], 10).astype(int)
+    thumb = [[small[rows[r]:rows[r + 1], cols[c]:cols[c + 1]].mean() for c in range(9)] for r in range(8)]
+
+    bits = 0
+    for row in thumb:
+        for col in range(8):
+            bits = (bits << 1) | int(row[col] > row[col + 1])
+    return doc_type, round(width / height, 2), bits
+
+
+def tables_closed(image: np.ndarray, boxes: List[Tuple[int, int, int, int]]) -> bool:
+    """
+    True when every table box (pixels) is followed by blank space of at least
+    LAYOUT_TABLE_MIN_GAP. A longer document of a cached layout runs rows past
+    the old bottom edge, which fails this check. Boxes reaching the page
+    bottom pass (nothing below them can be cut off).
+    """
+    height = image.shape[0]
+    skip = int(TABLE_EDGE_SKIP * height)
+    gap = max(1, int(LAYOUT_TABLE_MIN_GAP * height))
+    for x1, _, x2, y2 in boxes:
+        start = max(0, y2) + skip
+        band = image[start:min(height, start + gap), max(0, x1):max(0, x2)]
+        if band.size == 0:
+            continue
+        if band.ndim == 3:
+            band = band.min(axis=2)
+        # Rows with a couple of dark pixels are text / rules, not scan noise
+        if ((band < INK_THRESHOLD).sum(axis=1) >= 2).any():
+            return False
+    return True
+
+
+def normalize_boxes(boxes: List[Tuple[int, int, int, int]], size: Tuple[int, int]) -> List[Box]:
+    width, height = size
+    return sorted((x1 / width, y1 / height, x2 / width, y2 / height) for x1, y1, x2, y2 in boxes)
+
+
+def scale_boxes(boxes: List[Box], size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+    width, height = size
+    return [(int(x1 * width), int(y1 * height), int(x2 * width), int(y2 * height)) for x1, y1, x2, y2 in boxes]
+
+
+def _iou(a: Box, b: Box) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _same_boxes(a: List[Box], b: List[Box]) -> bool:
+    return len(a) == len(b) and all(_iou(x, y) >= BOX_MATCH_IOU for x, y in zip(a, b))
+
+
+class LayoutTemplateCache:
+    """
+    The 'Regulars List' for supplier layouts.
+
+    Maps a first-page fingerprint to the PO-number and table boxes YOLO found
+    on earlier documents of that layout. Once LAYOUT_MIN_CONFIRMATIONS
+    documents agreed on the same boxes, known layouts are cropped directly and
+    YOLO only runs for unknown layouts, failed template reads and periodic
+    re-checks. Table boxes are also re-detected whenever tables_closed()
+    finds content right under them. Templates are kept in a small JSON
+    file across runs.
+
+    Each template holds two independent entries, 'po' and 'table':
+        {"boxes": [[x1, y1, x2, y2], ...], "confirmations": n, "uses": n}
+    """
+
+    def __init__(self, path: str = LAYOUT_CACHE_PATH, enabled: bool = LAYOUT_CACHE):
+        self.path = path
+        self.enabled = enabled
+        self._templates = []
+        self._lock = threading.Lock()
+        if enabled:
+            self._load()
+            metrics.register_collector("layout_cache", self.snapshot)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._templates = json.load(f)
+            logger.info(f"Loaded {len(self._templates)} layout templates from {self.path}")
+        except FileNotFoundError:
+            self._templates = []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable layout cache {self.path}: {e}")
+            self._templates = []
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._templates, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save layout cache: {e}")
+
+    def _nearest(self, fingerprint: Fingerprint) -> Optional[dict]:
+        doc_type, aspect, bits = fingerprint
+        best, best_distance = None, LAYOUT_MAX_DISTANCE + 1
+        for template in self._templates:
+            if template.get("doc_type") != doc_type or abs(template["aspect"] - aspect) > 0.02:
+                continue
+            distance = bin(template["hash"] ^ bits).count("1")
+            if distance < best_distance:
+                best, best_distance = template, distance
+        return best
+
+    def lookup(self, fingerprint: Fingerprint, kind: str) -> Optional[List[Box]]:
+        """Confirmed boxes of `kind` ('po' / 'table') for this layout, or None to run YOLO."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            template = self._nearest(fingerprint)
+            entry = template.get(kind) if template else None
+            if not entry or entry["confirmations"] < LAYOUT_MIN_CONFIRMATIONS:
+                metrics.inc(f"layout_{kind}_misses")
+                return None
+            entry["uses"] += 1
+            if LAYOUT_RECHECK_EVERY and entry["uses"] % LAYOUT_RECHECK_EVERY == 0:
+                metrics.inc(f"layout_{kind}_rechecks")
+                return None
+            template["last_seen"] = time.time()
+            metrics.inc(f"layout_{kind}_hits")
+            return [tuple(b) for b in entry["boxes"]]
+
+    def learn(self, fingerprint: Fingerprint, kind: str, boxes: List[Box]):
+        """Records the boxes YOLO just confirmed for this layout."""
+        if not self.enabled or not boxes:
+            return
+        with self._lock:
+            template = self._nearest(fingerprint)
+            if template is None:
+                template = {"doc_type": fingerprint[0], "aspect": fingerprint[1], "hash": fingerprint[2]}
+                self._templates.append(template)
+                self._evict()
+
+            entry = template.get(kind)
+            if entry and _same_boxes(entry["boxes"], boxes):
+                entry["confirmations"] += 1
+            else:
+                template[kind] = {"boxes": [list(b) for b in boxes], "confirmations": 1, "uses": 0}
+            template["last_seen"] = time.time()
+            self._save()
+
+    def forget(self, fingerprint: Fingerprint, kind: str):
+        """
+        The template boxes gave no usable result (unreadable PO box, table
+        running past the box, or a table crop Gemini found no rows in):
+        back to YOLO until re-confirmed.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            template = self._nearest(fingerprint)
+            if template and template.pop(kind, None) is not None:
+                metrics.inc(f"layout_{kind}_rejected")
+                self._save()
+
+    def _evict(self):
+        if len(self._templates) > LAYOUT_MAX_TEMPLATES:
+            self._templates.sort(key=lambda t: t.get("last_seen", 0), reverse=True)
+            del self._templates[LAYOUT_MAX_TEMPLATES:]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            confirmed = sum(
+                1 for t in self._templates
+                if any(t.get(k, {}).get("confirmations", 0) >= LAYOUT_MIN_CONFIRMATIONS for k in ("po", "table"))
+            )
+            return {"templates": len(self._templates), "confirmed": confirmed}
+
+
+layout_cache = LayoutTemplateCache()
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+FAILURE_THRESHOLD = int(os.getenv("GEMINI_CIRCUIT_THRESHOLD", "2"))
+COOLDOWN_SECONDS = float(os.getenv("GEMINI_CIRCUIT_COOLDOWN", "300"))
+MAX_COOLDOWN_SECONDS = float(os.getenv("GEMINI_CIRCUIT_MAX_COOLDOWN", "3600"))
+LATENCY_SMOOTHING = 0.3  # EWMA weight of the newest sample
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+
+class _ModelStats:
+    def __init__(self, name: str, priority: int):
+        self.name = name
+        self.priority = priority
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_failure_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = COOLDOWN_SECONDS
+        self.probe_in_flight = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.failures / self.calls, 3) if self.calls else 0.0,
+            "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "last_failure_at": self.last_failure_at,
+            "last_error": self.last_error,
+            "open_until": self.open_until if self.state != CLOSED else None,
+        }
+
+
+class ModelHealthTracker:
+    """
+    The 'Triage Nurse' for the Gemini candidate list.
+
+    Tracks latency and failures per model and runs a circuit breaker:
+    - CLOSED: model is healthy and ordered by observed latency.
+    - OPEN: model failed repeatedly and is skipped until its cooldown expires.
+    - HALF_OPEN: cooldown expired; exactly one probe call is let through.
+      Success closes the circuit, failure re-opens it with a doubled cooldown.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _ModelStats] = {}
+
+    def _get(self, name: str, priority: int = 99) -> _ModelStats:
+        if name not in self._stats:
+            self._stats[name] = _ModelStats(name, priority)
+        return self._stats[name]
+
+    def plan(self, candidates: List[str]) -> List[str]:
+        """
+        Returns the models to try, in order, for the next call.
+        Probes (half-open) go first so a recovered model is noticed,
+        then healthy models fastest-first (untried ones keep list priority).
+        """
+        now = time.time()
+        probes, healthy, blocked = [], [], []
+
+        with self._lock:
+            for priority, name in enumerate(candidates):
+                stats = self._get(name, priority)
+                stats.priority = priority
+
+                if stats.state == CLOSED:
+                    healthy.append(stats)
+                elif now >= stats.open_until and not stats.probe_in_flight:
+                    stats.state = HALF_OPEN
+                    stats.probe_in_flight = True
+                    probes.append(stats)
+                else:
+                    blocked.append(stats)
+
+            healthy.sort(key=lambda s: (
+                s.latency_ewma is None,
+                s.latency_ewma if s.latency_ewma is not None else 0.0,
+                s.priority
+            ))
+            ordered = probes + healthy
+
+            # Every circuit is open: still try the one that recovers soonest
+            # rather than dropping the crop without a single attempt.
+            if not ordered and blocked:
+                ordered = [min(blocked, key=lambda s: s.open_until)]
+
+            return [s.name for s in ordered]
+
+    def record_success(self, name: str, latency: float):
+        with self._lock:
+            stats = self._get(name)
+            stats.calls += 1
+            stats.consecutive_failures = 0
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma = (LATENCY_SMOOTHING * latency
+                                      + (1 - LATENCY_SMOOTHING) * stats.latency_ewma)
+
+            if stats.state != CLOSED:
+                logger.info(f"🟢 Circuit closed for {name} (probe succeeded).")
+            stats.state = CLOSED
+            stats.cooldown = COOLDOWN_SECONDS
+            stats.probe_in_flight = False
+
+    def record_failure(self, name: str, error: str):
+        with self._lock:
+            stats = self._get(name)
+            stats.calls += 1
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            stats.last_failure_at = time.time()
+            stats.last_error = error[:200]
+
+            if stats.state in (HALF_OPEN, OPEN):
+                # Probe (or last-resort call) failed: back off harder
+                stats.cooldown = min(stats.cooldown * 2, MAX_COOLDOWN_SECONDS)
+                self._open(stats)
+            elif stats.state == CLOSED and stats.consecutive_failures >= FAILURE_THRESHOLD:
+                self._open(stats)
+            stats.probe_in_flight = False
+
+    def release(self, name: str):
+        """Ends a call without judging the model (e.g. rate limited, retried later)."""
+        with self._lock:
+            self._get(name).probe_in_flight = False
+
+    def _open(self, stats: _ModelStats):
+        stats.state = OPEN
+        stats.open_until = time.time() + stats.cooldown
+        logger.warning(f"🔴 Circuit opened for {stats.name} for {stats.cooldown:.0f}s "
+                       f"(last error: {stats.last_error})")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
@@ -0,0 +1,87 @@
+import os
+import logging
+import threading
+from typing import List, Tuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# ONNX Runtime thread pools. Unset (-1) lets ORT grab every core, which
+# oversubscribes the CPU as soon as several workers/processes run OCR.
+OCR_INTRA_OP_THREADS = int(os.getenv("OCR_INTRA_OP_THREADS", str(min(4, os.cpu_count() or 1))))
+OCR_INTER_OP_THREADS = int(os.getenv("OCR_INTER_OP_THREADS", "1"))
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """
+    Returns the single process-wide RapidOCR instance.
+    Both the full-page extractor and the YOLO sniper share it, so the
+    detection/recognition ONNX sessions are loaded once.
+    Returns None if RapidOCR cannot be loaded.
+    """
+    global _engine
+    if _engine is not None:
+        return _engine
+
+    with _engine_lock:
+        if _engine is not None:
+            return _engine
+
+        from rapidocr_onnxruntime import RapidOCR
+
+        options = dict(
+            det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False,
+            intra_op_num_threads=OCR_INTRA_OP_THREADS,
+            inter_op_num_threads=OCR_INTER_OP_THREADS,
+        )
+        try:
+            _engine = RapidOCR(**options)
+        except TypeError:
+            # Older rapidocr builds don't accept thread settings
+            logger.warning("RapidOCR does not support thread options; using defaults.")
+            for key in ('intra_op_num_threads', 'inter_op_num_threads'):
+                options.pop(key, None)
+            _engine = RapidOCR(**options)
+
+        logger.info(f"RapidOCR engine loaded (intra_op={OCR_INTRA_OP_THREADS}, inter_op={OCR_INTER_OP_THREADS}).")
+        return _engine
+
+
+def recognize_batch(images: List) -> List[Optional[Tuple[str, float]]]:
+    """
+    Recognition-only OCR for many small single-line crops (RGB numpy arrays,
+    like every other RapidOCR input here). Runs them through the recognizer
+    as one batch instead of a full detect + classify + recognize call per crop.
+    Returns (text, score) per image, None where nothing was read.
+    """
+    if not images:
+        return []
+
+    engine = get_ocr_engine()
+    text_rec = getattr(engine, "text_rec", None)
+
+    if text_rec is not None:
+        try:
+            # The recognizer is called directly, skipping RapidOCR's LoadImage
+            # RGB -> BGR step: convert here
+            bgr = [np.ascontiguousarray(img[..., ::-1]) if img.ndim == 3 else img for img in images]
+            rec_res, _ = text_rec(bgr)
+            return [(text, float(score)) if text else None for text, score in rec_res]
+        except Exception as e:
+            logger.debug(f"Batched recognition failed, falling back per image: {e}")
+
+    results = []
+    for img in images:
+        ocr_result, _ = engine(img)
+        if ocr_result:
+            text = " ".join(line[1] for line in ocr_result)
+            score = min(float(line[2]) for line in ocr_result)
+            results.append((text, score))
+        else:
+            results.append(None)
+    return results
@@ -0,0 +1,92 @@
+import os
+import re
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from src.core.metrics import metrics
+from .rendering import PdfiumDocument
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+PAGE_PREFILTER = os.getenv("PAGE_PREFILTER", "1") == "1"
+# Pages that get full-resolution table detection per document
+TABLE_SCAN_PAGES = int(os.getenv("TABLE_SCAN_PAGES", "5"))
+# Pages screened to choose them (long POs keep their table on page 7+)
+TABLE_SCREEN_PAGES = int(os.getenv("TABLE_SCREEN_PAGES", "30"))
+# Below this many text-layer characters a page is treated as a scan
+MIN_TEXT_CHARS = 50
+# Scale of the ink check render (1.0 = 72 dpi)
+INK_SCALE = 0.2
+# Fraction of dark pixels under which a scanned page counts as blank
+BLANK_INK_RATIO = float(os.getenv("BLANK_INK_RATIO", "0.004"))
+
+TABLE_KEYWORDS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r'\bqty\b|\bquantity\b',
+        r'\bdescription\b',
+        r'\bunit\s*price\b|\brate\b',
+        r'\bamount\b|\btotal\b',
+        r'\bpart\s*(no|number)\b|\bitem\s*(no|code)?\b|\bsl\.?\s*no\b',
+        r'\buom\b|\bunit\b',
+    )
+]
+TERMS_PATTERN = re.compile(r'terms\s*(and|&)\s*conditions|general\s+conditions', re.IGNORECASE)
+
+
+def _ink_ratio(pdf: PdfiumDocument, index: int) -> float:
+    page_image = pdf.render_page(index, scale=INK_SCALE, grayscale=True)
+    try:
+        return float(np.mean(page_image.array < 160))
+    finally:
+        page_image.close()
+
+
+def score_page(pdf: PdfiumDocument, index: int) -> float:
+    """
+    How likely a page holds a line-item table. 0 means skip it.
+      text page  : distinct table-header keywords ("Qty", "Description", ...);
+                   terms & conditions pages without them score 0
+      scan       : blank backs score 0, anything else gets a look
+    """
+    text = pdf.page_text(index)
+    if len(text.strip()) >= MIN_TEXT_CHARS:
+        hits = sum(1 for pattern in TABLE_KEYWORDS if pattern.search(text))
+        if hits >= 2:
+            return 2.0 + hits
+        if TERMS_PATTERN.search(text):
+            return 0.0
+        return 0.5
+
+    return 1.0 if _ink_ratio(pdf, index) >= BLANK_INK_RATIO else 0.0
+
+
+def select_table_pages(pdf: PdfiumDocument, max_pages: Optional[int] = None) -> List[int]:
+    """
+    Picks up to `max_pages` (default TABLE_SCAN_PAGES) page indexes, in
+    reading order, worth rendering at full resolution for table detection,
+    out of the first TABLE_SCREEN_PAGES. Best scores win; ties go to earlier pages.
+    """
+    page_count = len(pdf)
+    max_pages = max_pages or TABLE_SCAN_PAGES
+    if not PAGE_PREFILTER:
+        return list(range(min(max_pages, page_count)))
+
+    scored = []
+    for i in range(min(TABLE_SCREEN_PAGES, page_count)):
+        try:
+            score = score_page(pdf, i)
+        except Exception as e:
+            logger.debug(f"Page {i} prefilter failed, keeping it: {e}")
+            score = 1.0
+        if score > 0:
+            scored.append((score, i))
+
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    selected = sorted(i for _, i in scored[:max_pages])
+
+    metrics.inc("prefilter_pages_screened", min(TABLE_SCREEN_PAGES, page_count))
+    metrics.inc("prefilter_pages_selected", len(selected))
+    return selected
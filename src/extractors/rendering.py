@@ -0,0 +1,102 @@
+import threading
+
+import numpy as np
+import pypdfium2 as pdfium
+from PIL import Image
+
+# PDFium is not thread-safe, and the staged pipeline reads PDFs from several
+# threads (resolve / tables stages, inference server connections). Every
+# pypdfium2 call in the process (open, page load, render, text page, close)
+# holds this lock; detection and OCR on the rendered buffers run outside it.
+pdfium_lock = threading.RLock()
+
+
+class PageImage:
+    """
+    A rendered PDF page backed directly by pdfium's bitmap buffer.
+
+    `array` is a numpy *view* of that buffer (H x W x 3, or H x W when
+    grayscale): no PIL round trip, no extra copy. Channel order depends on
+    who reads it:
+      BGR (default) : YOLO / OpenCV convention
+      RGB (rgb=True): RapidOCR, which treats numpy input as RGB and converts
+                      it to BGR itself; pdfium renders RGB directly
+    Crops are views too. Views are only valid until close(); anything that
+    outlives the page goes through to_pil() or ocr_crop() (copies).
+    """
+
+    def __init__(self, page, scale: float, grayscale: bool = False, rgb: bool = False):
+        self.rgb = rgb and not grayscale
+        self._bitmap = page.render(scale=scale, grayscale=grayscale, rev_byteorder=self.rgb)
+        self.array = self._bitmap.to_numpy()
+
+    @property
+    def size(self):
+        """(width, height), like PIL."""
+        return self.array.shape[1], self.array.shape[0]
+
+    def crop(self, box) -> np.ndarray:
+        """View of (x1, y1, x2, y2), clamped to the page."""
+        x1, y1, x2, y2 = box
+        width, height = self.size
+        return self.array[max(0, y1):min(height, y2), max(0, x1):min(width, x2)]
+
+    def ocr_crop(self, box) -> np.ndarray:
+        """RGB copy of a region for RapidOCR (small: crops, not pages)."""
+        region = self.crop(box)
+        if region.ndim == 3 and not self.rgb:
+            region = region[..., ::-1]
+        return np.ascontiguousarray(region)
+
+    def to_pil(self, box=None) -> Image.Image:
+        """RGB (or L) copy of the page or a region, for consumers that keep it."""
+        region = self.array if box is None else self.crop(box)
+        if region.ndim == 3 and not self.rgb:
+            region = region[..., ::-1]
+        return Image.fromarray(np.ascontiguousarray(region))
+
+    def close(self):
+        self.array = None
+        with pdfium_lock:
+            self._bitmap.close()
+
+
+class PdfiumDocument:
+    """
+    A pypdfium2 document whose every call holds pdfium_lock. Pages are
+    loaded, rendered / read and closed in one locked step, so callers never
+    touch a pdfium page object.
+    """
+
+    def __init__(self, file_path: str):
+        with pdfium_lock:
+            self._pdf = pdfium.PdfDocument(file_path)
+            self._page_count = len(self._pdf)
+
+    def __len__(self) -> int:
+        return self._page_count
+
+    def render_page(self, index: int, scale: float, grayscale: bool = False, rgb: bool = False) -> PageImage:
+        with pdfium_lock:
+            page = self._pdf[index]
+            try:
+                return PageImage(page, scale, grayscale, rgb)
+            finally:
+                page.close()
+
+    def page_text(self, index: int) -> str:
+        """Text layer of one page ("" for scans)."""
+        with pdfium_lock:
+            page = self._pdf[index]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    return textpage.get_text_range() or ""
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+
+    def close(self):
+        with pdfium_lock:
+            self._pdf.close()
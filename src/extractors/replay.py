@@ -0,0 +1,190 @@
+import os
+import json
+import logging
+import threading
+from typing import Callable, Optional
+
+from PIL import Image
+
+from src.core.archive_store import file_sha256
+from src.core.metrics import metrics
+from .base import BaseTextExtractor
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTS ---
+# off    : extractors and Gemini run live, nothing is stored
+# record : run live and save every output under REPLAY_DIR
+# replay : serve outputs from REPLAY_DIR (no models, no network)
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off").lower()
+REPLAY_DIR = os.getenv("REPLAY_DIR", "fixtures")
+# What is played back in replay mode; the rest runs live.
+# e.g. REPLAY_SCOPE=gemini profiles YOLO/OCR for real with the API offline.
+REPLAY_SCOPE = {s.strip() for s in os.getenv("REPLAY_SCOPE", "yolo,ocr,digital,gemini").split(",") if s.strip()}
+
+
+class FixtureMissing(LookupError):
+    """Replay mode asked for an output that was never recorded."""
+
+
+class FixtureStore:
+    """
+    The 'Tape Deck' for extractor and API outputs.
+
+    Everything is keyed by the SHA-256 of the source PDF, so a recording still
+    matches after the file was renamed, moved or archived:
+        fixtures/ab/abcd...ef/meta.json           original filename
+        fixtures/ab/abcd...ef/po_text.json        YOLO sniper output
+        fixtures/ab/abcd...ef/ocr_text.json       full-page RapidOCR output
+        fixtures/ab/abcd...ef/digital_text.json   text layer output
+        fixtures/ab/abcd...ef/crops.json          [[page, crop_seq, png], ...]
+        fixtures/ab/abcd...ef/p0_c0.png           table crop (lossless)
+        fixtures/ab/abcd...ef/gemini_p0_c0.json   Gemini reply for that crop
+    """
+
+    def __init__(self, root: str = REPLAY_DIR, mode: str = REPLAY_MODE, scope: Optional[set] = None):
+        self.root = root
+        self.mode = mode
+        self.scope = scope if scope is not None else REPLAY_SCOPE
+        self._hashes = {}  # (abspath, size, mtime_ns) -> sha256
+        self._lock = threading.Lock()
+
+        if mode not in ('off', 'record', 'replay'):
+            raise ValueError(f"Unknown REPLAY_MODE: {mode}")
+        if mode != 'off':
+            logger.info(f"📼 Fixture store in {mode.upper()} mode at {os.path.abspath(root)}")
+
+    def replays(self, kind: str) -> bool:
+        return self.mode == 'replay' and kind in self.scope
+
+    def records(self) -> bool:
+        return self.mode == 'record'
+
+    def file_key(self, file_path: str) -> str:
+        """Content hash of the source PDF, computed once per file version."""
+        stat = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(cache_key)
+        if digest is None:
+            digest = file_sha256(file_path)
+            with self._lock:
+                self._hashes[cache_key] = digest
+        return digest
+
+    def _dir(self, file_path: str) -> str:
+        digest = self.file_key(file_path)
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _write_json(self, path: str, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def _remember_source(self, file_path: str):
+        meta_path = os.path.join(self._dir(file_path), "meta.json")
+        if not os.path.exists(meta_path):
+            self._write_json(meta_path, {"filename": os.path.basename(file_path)})
+
+    def cached(self, kind: str, file_path: str, name: str, compute: Callable[[], str]) -> str:
+        """
+        Returns the output `name` for this file: from the store when replaying
+        `kind`, otherwise from compute() (saved when recording).
+        """
+        path = os.path.join(self._dir(file_path), f"{name}.json")
+
+        if self.replays(kind):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except FileNotFoundError:
+                metrics.inc("replay_misses")
+                raise FixtureMissing(f"No recorded {name} for {os.path.basename(file_path)}")
+            metrics.inc("replay_hits")
+            return value
+
+        value = compute()
+        if self.records():
+            self._remember_source(file_path)
+            self._write_json(path, value)
+            metrics.inc("replay_recorded")
+        return value
+
+    def iter_table_crops(self, file_path: str, compute: Callable):
+        """Yields (page_index, crop) from the store or from compute(), recording as it goes."""
+        folder = self._dir(file_path)
+        index_path = os.path.join(folder, "crops.json")
+
+        if self.replays('yolo'):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except FileNotFoundError:
+                metrics.inc("replay_misses")
+                raise FixtureMissing(f"No recorded table crops for {os.path.basename(file_path)}")
+            metrics.inc("replay_hits")
+            for page_index, crop_seq, png in index:
+                with Image.open(os.path.join(folder, png)) as img:
+                    crop = img.convert("RGB")
+                yield page_index, crop
+            return
+
+        if not self.records():
+            yield from compute()
+            return
+
+        self._remember_source(file_path)
+        index = []
+        for crop_seq, (page_index, crop) in enumerate(compute()):
+            png = f"p{page_index}_c{crop_seq}.png"
+            crop.save(os.path.join(folder, png), format="PNG")
+            index.append([page_index, crop_seq, png])
+            yield page_index, crop
+        # Only a complete pass is written, so replay never sees half a file
+        self._write_json(index_path, index)
+        metrics.inc("replay_recorded")
+
+    def line_items(self, file_path: str, page_index: int, crop_seq: int, call: Callable[[], str]) -> str:
+        """Gemini reply for one table crop."""
+        return self.cached('gemini', file_path, f"gemini_p{page_index}_c{crop_seq}", call)
+
+    def wrap(self, kind: str, extractor):
+        """Puts a recording/replaying facade in front of an extractor (if needed)."""
+        if self.replays(kind) or (self.records() and extractor is not None):
+            return ReplayExtractor(kind, extractor, self)
+        return extractor
+
+
+class ReplayExtractor(BaseTextExtractor):
+    """Routes an extractor through the FixtureStore. `inner` may be None when replaying."""
+
+    OUTPUT_NAMES = {'yolo': 'po_text', 'ocr': 'ocr_text', 'digital': 'digital_text'}
+
+    def __init__(self, kind: str, inner, store: FixtureStore):
+        self.kind = kind
+        self.inner = inner
+        self.store = store
+
+    def extract(self, file_path: str, cancel: Optional[threading.Event] = None,
+                doc_type: Optional[str] = None) -> str:
+        # `cancel` is not forwarded: a cut-short output must never be recorded
+        if self.kind == 'yolo':
+            compute = lambda: self.inner.extract(file_path, doc_type=doc_type)
+        else:
+            compute = lambda: self.inner.extract(file_path)
+        return self.store.cached(self.kind, file_path, self.OUTPUT_NAMES[self.kind], compute)
+
+    def iter_table_crops(self, file_path: str, doc_type: Optional[str] = None):
+        return self.store.iter_table_crops(file_path, lambda: self.inner.iter_table_crops(file_path, doc_type))
+
+    def reject_table_template(self, fingerprint):
+        if self.inner is not None:
+            self.inner.reject_table_template(fingerprint)
+
+    def extract_all_table_crops(self, file_path: str) -> list:
+        return [crop for _, crop in self.iter_table_crops(file_path)]
+
+
+fixtures = FixtureStore()
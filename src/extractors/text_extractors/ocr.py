@@ -1,8 +1,11 @@
 import logging
-import numpy as np
-from pdf2image import convert_from_path
-from rapidocr_onnxruntime import RapidOCR
+from src.core.memory_governor import governor
 from ..base import BaseTextExtractor
+from ..ocr_engine import get_ocr_engine
+from ..rendering import PdfiumDocument
+
+# 200 DPI is enough for RapidOCR (pdfium renders at 72 DPI per unit of scale)
+OCR_RENDER_SCALE = 200 / 72
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +20,9 @@ class RapidOCRExtractor(BaseTextExtractor):
     """
     
     def __init__(self):
-        # Initialize the model once to save overhead
-        # det_use_cuda=False ensures it runs on CPU without crashing
+        # Shared engine: the YOLO sniper uses the same ONNX sessions
         try:
-            self.engine = RapidOCR(det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False)
+            self.engine = get_ocr_engine()
             self._model_loaded = True
         except Exception as e:
             logger.error(f"Failed to load RapidOCR: {e}")
@@ -31,17 +33,23 @@ class RapidOCRExtractor(BaseTextExtractor):
             return ""
 
         text_content = []
+        pdf = None
         try:
-            # 1. Convert PDF pages to images (Memory efficient: 200 DPI is enough for RapidOCR)
-            images = convert_from_path(file_path, dpi=200)
+            pdf = PdfiumDocument(file_path)
             
-            for i, image in enumerate(images):
-                # Convert PIL image to numpy array (RGB)
-                img_array = np.array(image)
-                
-                # 2. Run OCR
-                # result structure: [[[[x1,y1],...], "text", confidence], ...]
-                result, _ = self.engine(img_array)
+            # Under memory pressure: fewer pages, lower resolution
+            for i in range(governor.page_cap(len(pdf))):
+                # 1. Render one page straight into a numpy (RGB) view: no
+                #    pdftoppm round trip, and only this page is in memory
+                with governor.page_slot():
+                    page_image = pdf.render_page(i, scale=governor.render_scale(OCR_RENDER_SCALE), rgb=True)
+                    
+                    # 2. Run OCR
+                    # result structure: [[[[x1,y1],...], "text", confidence], ...]
+                    try:
+                        result, _ = self.engine(page_image.array)
+                    finally:
+                        page_image.close()
                 
                 if result:
                     # Extract just the text parts and join them
@@ -52,4 +60,7 @@ class RapidOCRExtractor(BaseTextExtractor):
             
         except Exception as e:
             logger.error(f"RapidOCR extraction failed for {file_path}: {e}")
-            return ""
\ No newline at end of file
+            return ""
+        finally:
+            if pdf is not None:
+                pdf.close()
\ No newline at end of file
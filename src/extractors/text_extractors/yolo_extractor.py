@@ -1,10 +1,17 @@
 import logging
-import numpy as np
 from PIL import Image
-import pypdfium2 as pdfium 
 from ..base import BaseTextExtractor
 import os
-import cv2
+import threading
+from typing import Optional
+from src.core.memory_governor import governor
+from ..debug_writer import debug_writer
+from ..ocr_engine import get_ocr_engine, recognize_batch
+from ..rendering import PageImage, PdfiumDocument
+from ..layout_cache import (layout_cache, layout_fingerprint, normalize_boxes, scale_boxes, tables_closed,
+                            TEMPLATE_INFO_KEY)
+from ..page_filter import select_table_pages, TABLE_SCAN_PAGES
+from ..po_finder import heuristics
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,74 +19,134 @@ logger = logging.getLogger(__name__)
 # --- CONSTANTS ---
 # Lower threshold slightly to catch faint tables
 CONFIDENCE_THRESHOLD = 0.25 
-DEBUG_OUTPUT_DIR = "debug_yolo_crops"
+# Page render scale for detection (3 = 216 DPI); the memory governor lowers it under pressure
+RENDER_SCALE = 3
+# PO boxes at least this wide (w/h) are treated as one text line and go
+# through batched recognition; taller boxes get full det + rec.
+SINGLE_LINE_ASPECT = 2.5
+# Detection model, relative to the working directory
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "po_detector.pt")
 
 class YoloExtractor(BaseTextExtractor):
-    def __init__(self, model_path="po_detector.pt", target_class_id=1):
+    def __init__(self, model_path=YOLO_MODEL_PATH, target_class_id=1):
         self.model_path = model_path
         self.target_class_id = target_class_id # PO Number Class
         self.yolo_model = None
         self.ocr_engine = None
         self._loaded = False
-        
-        if not os.path.exists(DEBUG_OUTPUT_DIR):
-            os.makedirs(DEBUG_OUTPUT_DIR)
+        # Ultralytics predictors are not thread-safe: serialize inference only,
+        # rendering and OCR still overlap across pipeline stages.
+        self._infer_lock = threading.Lock()
 
     def _load_models(self):
         if self._loaded: return
         try:
             from ultralytics import YOLO
-            from rapidocr_onnxruntime import RapidOCR
             self.yolo_model = YOLO(self.model_path)
-            self.ocr_engine = RapidOCR(det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False)
+            self.ocr_engine = get_ocr_engine()
             logger.info("✅ YOLO + RapidOCR loaded successfully.")
             self._loaded = True
         except ImportError:
             logger.error("Missing dependencies.")
 
-    def extract(self, file_path: str) -> str:
+    def extract(self, file_path: str, cancel: Optional[threading.Event] = None,
+                doc_type: Optional[str] = None) -> str:
         """
         Extracts PO Number.
+        `cancel` (speculative mode): once set, gives up at the next step
+        (render / detection / OCR) and returns "".
+        `doc_type` keeps layout templates of POs, DOs and SIs apart.
         """
         self._load_models()
         if not self.yolo_model: return ""
 
-        extracted_candidates = []
+        pdf = None
         try:
-            pdf = pdfium.PdfDocument(file_path)
+            pdf = PdfiumDocument(file_path)
             # Scan first page only for PO Number
             for i in range(min(1, len(pdf))):
-                page = pdf[i]
-                pil_image = page.render(scale=3).to_pil().convert("RGB")
-                
-                # Run YOLO
-                results = self.yolo_model(pil_image, verbose=False, conf=CONFIDENCE_THRESHOLD)
-                
-                for result in results:
-                    for box in result.boxes:
-                        if int(box.cls[0]) == self.target_class_id:
-                            # Found PO Box
-                            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                            crop = pil_image.crop((x1-5, y1-5, x2+5, y2+5))
-                            
-                            # OCR
-                            crop_np = np.array(crop)
-                            ocr_result, _ = self.ocr_engine(crop_np)
-                            
-                            if ocr_result:
-                                for line in ocr_result:
-                                    text = line[1].strip()
-                                    if any(char.isdigit() for char in text):
-                                        extracted_candidates.append(text)
-
-                if extracted_candidates:
-                    return "\n".join(extracted_candidates)
+                with governor.page_slot():
+                    page_image = pdf.render_page(i, scale=governor.render_scale(RENDER_SCALE))
+                    try:
+                        text = self._find_po_text(page_image, cancel, doc_type)
+                    finally:
+                        page_image.close()
+                if text:
+                    return text
 
             return "" 
 
         except Exception as e:
             logger.error(f"Sniper extraction failed: {e}")
             return ""
+        finally:
+            # Unclosed documents keep their file handle and pdfium memory
+            # until GC, which a long-running daemon never reliably reaches
+            if pdf is not None:
+                pdf.close()
+
+    def _find_po_text(self, page_image: PageImage, cancel: Optional[threading.Event],
+                      doc_type: Optional[str] = None) -> str:
+        # Known supplier layout: read the PO box where it always is
+        fingerprint = layout_fingerprint(page_image.array, doc_type) if layout_cache.enabled else None
+        template_boxes = layout_cache.lookup(fingerprint, 'po') if fingerprint else None
+        if template_boxes:
+            text = self._read_po_boxes(page_image, scale_boxes(template_boxes, page_image.size))
+            if heuristics.rescue_yolo_hit(text):
+                return text
+            layout_cache.forget(fingerprint, 'po')
+        
+        # Run YOLO
+        with self._infer_lock:
+            if cancel is not None and cancel.is_set():
+                return ""
+            results = self.yolo_model(page_image.array, verbose=False, conf=CONFIDENCE_THRESHOLD)
+        
+        if cancel is not None and cancel.is_set():
+            return ""
+
+        boxes = []
+        for result in results:
+            for box in result.boxes:
+                if int(box.cls[0]) == self.target_class_id:
+                    # Found PO Box
+                    boxes.append(tuple(map(int, box.xyxy[0].tolist())))
+
+        text = self._read_po_boxes(page_image, boxes)
+        if text and fingerprint and heuristics.rescue_yolo_hit(text):
+            layout_cache.learn(fingerprint, 'po', normalize_boxes(boxes, page_image.size))
+        return text
+
+    def _read_po_boxes(self, page_image: PageImage, boxes: list) -> str:
+        """OCRs the PO boxes (pixel x1, y1, x2, y2) and keeps lines containing digits."""
+        extracted_candidates = []
+        single_line, multi_line = [], []
+        for x1, y1, x2, y2 in boxes:
+            # The page buffer is BGR for YOLO; RapidOCR wants RGB (small copy)
+            crop_np = page_image.ocr_crop((x1-5, y1-5, x2+5, y2+5))
+            height = max(1, y2 - y1)
+            if (x2 - x1) / height >= SINGLE_LINE_ASPECT:
+                single_line.append(crop_np)
+            else:
+                multi_line.append(crop_np)
+
+        # OCR: one batched recognizer call for all single-line boxes
+        for hit in recognize_batch(single_line):
+            if hit:
+                text = hit[0].strip()
+                if any(char.isdigit() for char in text):
+                    extracted_candidates.append(text)
+
+        for crop_np in multi_line:
+            ocr_result, _ = self.ocr_engine(crop_np)
+            
+            if ocr_result:
+                for line in ocr_result:
+                    text = line[1].strip()
+                    if any(char.isdigit() for char in text):
+                        extracted_candidates.append(text)
+
+        return "\n".join(extracted_candidates)
 
     def extract_table_crop(self, file_path: str) -> Image.Image:
         """
@@ -91,9 +158,19 @@ class YoloExtractor(BaseTextExtractor):
     def extract_all_table_crops(self, file_path: str) -> list[Image.Image]:
         """
         Scans ALL pages for tables and returns a list of crop images.
+        Prefer iter_table_crops() on the hot path: this holds every crop at once.
+        """
+        return [crop for _, crop in self.iter_table_crops(file_path)]
+
+    def iter_table_crops(self, file_path: str, doc_type: Optional[str] = None):
+        """
+        Streaming variant: yields (page_index, crop) as soon as each page is
+        detected. Only the current page bitmap is alive at any time; it is
+        released (and the PDF closed) as the generator advances/finishes.
+        Which pages are detected is decided by select_table_pages().
         """
         self._load_models()
-        if not self.yolo_model: return []
+        if not self.yolo_model: return
 
         TABLE_CLASS_ID = None
         for id, name in self.yolo_model.names.items():
@@ -101,50 +178,91 @@ class YoloExtractor(BaseTextExtractor):
                 TABLE_CLASS_ID = id
                 break
         
-        if TABLE_CLASS_ID is None: return []
+        if TABLE_CLASS_ID is None: return
 
-        found_crops = []
+        record_debug = debug_writer.should_record(file_path)
 
+        pdf = None
         try:
-            pdf = pdfium.PdfDocument(file_path)
-            # Scan up to 5 pages
-            for i in range(min(5, len(pdf))):
-                page = pdf[i]
-                pil_image = page.render(scale=3).to_pil().convert("RGB")
-                
-                results = self.yolo_model(pil_image, verbose=False, conf=CONFIDENCE_THRESHOLD)
-                
-                for result in results:
-                    # Save debug image
-                    debug_saved = False
-                    
-                    for box in result.boxes:
-                        if int(box.cls[0]) == TABLE_CLASS_ID:
-                            # Found Table!
-                            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                            width, height = pil_image.size
-                            
-                            crop = pil_image.crop((
-                                max(0, x1 - 10), 
-                                max(0, y1 - 10), 
-                                min(width, x2 + 10), 
-                                min(height, y2 + 10)
-                            ))
-                            found_crops.append(crop)
-                            
-                            if not debug_saved:
-                                debug_img_array = result.plot()
-                                debug_filename = f"{os.path.basename(file_path)}_p{i}_debug.jpg"
-                                debug_path = os.path.join(DEBUG_OUTPUT_DIR, debug_filename)
-                                try:
-                                    cv2.imwrite(debug_path, debug_img_array)
-                                    logger.info(f"Saved YOLO debug image to {debug_path}")
-                                    debug_saved = True
-                                except Exception:
-                                    pass
-            
-            return found_crops 
+            pdf = PdfiumDocument(file_path)
+            # Only pages the cheap prefilter picked (text layer / ink check),
+            # fewer under memory pressure
+            for i in select_table_pages(pdf, governor.page_cap(TABLE_SCAN_PAGES)):
+                with governor.page_slot():
+                    page_image = pdf.render_page(i, scale=governor.render_scale(RENDER_SCALE))
+                    try:
+                        page_crops = self._table_crops_on_page(page_image, i, TABLE_CLASS_ID,
+                                                               file_path, record_debug, doc_type)
+                    finally:
+                        # Drop the full page before handing crops downstream
+                        page_image.close()
+
+                for crop in page_crops:
+                    yield i, crop
             
         except Exception as e:
             logger.error(f"Table crop failed: {e}")
-            return []
\ No newline at end of file
+        finally:
+            if pdf is not None:
+                pdf.close()
+
+    def _table_crops_on_page(self, page_image: PageImage, i: int, table_class_id: int,
+                             file_path: str, record_debug: bool, doc_type: Optional[str] = None) -> list:
+        page_crops = []
+        fingerprint = None
+        template_boxes = None
+        if i == 0 and layout_cache.enabled:
+            fingerprint = layout_fingerprint(page_image.array, doc_type)
+            template_boxes = layout_cache.lookup(fingerprint, 'table')
+
+        if template_boxes:
+            # Known supplier layout: the table starts where it always does,
+            # unless this one has more rows and runs past the cached edge
+            boxes = scale_boxes(template_boxes, page_image.size)
+            if tables_closed(page_image.array, boxes):
+                crops = [self._crop_table(page_image, box) for box in boxes]
+                for crop in crops:
+                    # Lets the pipeline drop the template if Gemini reads no rows from it
+                    crop.info[TEMPLATE_INFO_KEY] = fingerprint
+                return crops
+            layout_cache.forget(fingerprint, 'table')
+
+        with self._infer_lock:
+            results = self.yolo_model(page_image.array, verbose=False, conf=CONFIDENCE_THRESHOLD)
+
+        table_boxes = []
+        for result in results:
+            # Save debug image
+            debug_saved = False
+            
+            for box in result.boxes:
+                if int(box.cls[0]) == table_class_id:
+                    # Found Table!
+                    table_box = tuple(map(int, box.xyxy[0].tolist()))
+                    table_boxes.append(table_box)
+                    page_crops.append(self._crop_table(page_image, table_box))
+                    
+                    if record_debug and not debug_saved:
+                        # Plotting + encoding happen on the writer thread, after
+                        # the page buffer is gone: give it its own copy
+                        result.orig_img = result.orig_img.copy()
+                        debug_filename = f"{os.path.basename(file_path)}_p{i}_debug.jpg"
+                        debug_writer.submit(debug_filename, result.plot)
+                        debug_saved = True
+
+        if fingerprint and table_boxes:
+            if tables_closed(page_image.array, table_boxes):
+                layout_cache.learn(fingerprint, 'table', normalize_boxes(table_boxes, page_image.size))
+            else:
+                # Table runs into the content below: its box is not stable for this layout
+                layout_cache.forget(fingerprint, 'table')
+        return page_crops
+
+    def reject_table_template(self, fingerprint):
+        """A table crop cut from this cached layout gave no line items: stop trusting it."""
+        layout_cache.forget(fingerprint, 'table')
+
+    def _crop_table(self, page_image: PageImage, box) -> Image.Image:
+        """Copies the table region out as RGB (it outlives the page buffer)."""
+        x1, y1, x2, y2 = box
+        return page_image.to_pil((x1 - 10, y1 - 10, x2 + 10, y2 + 10))
@@ -7,16 +7,39 @@ logger = logging.getLogger(__name__)
 class Reconciler:
     def __init__(self, db_manager):
         self.db = db_manager
+        # Keep the materialized po_summary in step with every line item write
+        self.db.add_line_items_listener(self._on_line_items_saved)
 
     def reconcile_po(self, po_number: str) -> Dict[str, Any]:
+        """
+        Returns the 3-Way Match report for a PO Universe.
+        Read from the materialized po_summary (one indexed lookup); computed
+        and stored on the spot only if this PO has never been summarized.
+        """
+        report = self.db.get_po_summary(po_number)
+        if report is None:
+            report = self.refresh_summary(po_number)
+        return report
+
+    def refresh_summary(self, po_number: str) -> Dict[str, Any]:
+        """Recomputes a PO's report from its line items and stores it."""
+        report = self.compute_report(po_number)
+        self.db.save_po_summary(report)
+        return report
+
+    def _on_line_items_saved(self, po_numbers):
+        for po_number in po_numbers:
+            self.refresh_summary(po_number)
+
+    def compute_report(self, po_number: str) -> Dict[str, Any]:
         """
         Performs 3-Way Matching for a specific PO Universe.
         Returns a detailed status report.
         """
-        # 1. Fetch all items for this Universe
-        all_items = self.db.fetch_line_items(po_number)
+        # 1. Fetch quantities for this Universe (index-only read)
+        all_rows = self.db.fetch_reconciliation_rows(po_number)
         
-        if not all_items:
+        if not all_rows:
             return {
                 "po_number": po_number,
                 "overall_status": "EMPTY",
@@ -29,30 +52,27 @@ class Reconciler:
         dn_ledger = defaultdict(float) 
         si_ledger = defaultdict(float) 
 
-        for item in all_items:
-            doc_type = item.get('doc_type', '').lower()
-            line_ref = str(item.get('line_ref'))
-            # Safe float conversion
-            try:
-                qty = float(item.get('quantity', 0.0))
-            except:
-                qty = 0.0
-            
-            # Normalize Line Ref (remove decimals like '1.0' -> '1')
-            if line_ref.endswith('.0'):
-                line_ref = line_ref[:-2]
+        # PO rows arrive one by one in insertion order, so the last row for a
+        # line_ref wins (the old row-by-row overwrite); DO/SI come summed per file.
+        for row in all_rows:
+            doc_type = (row.get('doc_type') or '').lower()
+            line_ref = str(row.get('line_ref'))
+            qty = row.get('quantity') or 0.0
 
             if doc_type == 'po':
-                po_ledger[line_ref] = {
-                    "qty": qty,
-                    "desc": item.get('description', 'Unknown Item'),
-                    "part_no": item.get('part_no', '')
-                }
+                po_ledger[line_ref] = {"qty": qty}
             elif doc_type in ['do', 'dn']:
                 dn_ledger[line_ref] += qty
             elif doc_type == 'si':
                 si_ledger[line_ref] += qty
 
+        if po_ledger:
+            details = self.db.fetch_po_item_details(po_number)
+            for line_ref, entry in po_ledger.items():
+                info = details.get(line_ref, {})
+                entry["desc"] = info.get('description') or 'Unknown Item'
+                entry["part_no"] = info.get('part_no') or ''
+
         # --- CRITICAL FIX: CIRCUIT BREAKER ---
         # If we found items for DN/SI but NO items for PO, it means PO extraction failed.
         # We cannot match against an empty list.